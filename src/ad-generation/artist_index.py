@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import time
+import cache
+import fetch
+
+
+KEYS = 'KEYS'
+INDEX_PATH = 'artists.sqlite'
+
+CATALOG_QUERY = 'https://api.bestbuy.com/v1/products(type=Music)' \
+                '?apiKey={}&format=json&pageSize=100' \
+                '&show=artistName,format,image,url,details.value'
+
+
+def tokenize(artist):
+    """The words of an artist name, as get_products compares them"""
+    return set(artist.lower().split())
+
+
+class ArtistIndex:
+    """
+    On-disk inverted index from the words of artist names to Best Buy
+    music products, so surname lookups need no API calls. The index
+    records when an ingest of the whole catalog last finished, and is
+    only current for Best Buy's cache TTL after that.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS products ('
+                                    'id INTEGER PRIMARY KEY, artist TEXT, format TEXT, '
+                                    'image TEXT, url TEXT UNIQUE, details INTEGER)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS tokens ('
+                                    'token TEXT, product INTEGER, '
+                                    'PRIMARY KEY (token, product)) WITHOUT ROWID')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS ingests (finished REAL)')
+
+    def is_current(self, ttl=cache.SOURCE_TTLS['api.bestbuy.com']):
+        """Whether the whole catalog was ingested in the last ttl seconds"""
+        finished = self.connection.execute('SELECT MAX(finished) FROM ingests').fetchone()[0]
+        return finished is not None and time.time() - finished <= ttl
+
+    def add_products(self, products):
+        """Add products from the catalog API, skipping any already indexed"""
+        with self.connection:
+            for product in products:
+                cursor = self.connection.execute(
+                    'INSERT OR IGNORE INTO products (artist, format, image, url, details) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (product['artistName'], product['format'], product['image'],
+                     product['url'], bool(product['details'])))
+                if cursor.rowcount:
+                    self.connection.executemany('INSERT OR IGNORE INTO tokens VALUES (?, ?)',
+                                                [(token, cursor.lastrowid)
+                                                 for token in tokenize(product['artistName'])])
+
+    def ingest(self, api_key, max_pages=None):
+        """
+        Page through the Best Buy music catalog, replacing the index.
+        With max_pages, only the first pages are indexed, and the index
+        is not marked current.
+        """
+        with self.connection:
+            for table in ('ingests', 'tokens', 'products'):
+                self.connection.execute('DELETE FROM {}'.format(table))
+        pages = fetch.DEFAULT.get_pages(CATALOG_QUERY.format(api_key),
+                                        page_count=lambda page: min(page['totalPages'],
+                                                                    max_pages or page['totalPages']))
+        for page in pages:
+            print('Indexed page {} of {}'.format(page['currentPage'], page['totalPages']))
+            self.add_products(page['products'])
+        if page['currentPage'] == page['totalPages']:
+            with self.connection:
+                self.connection.execute('INSERT INTO ingests VALUES (?)', (time.time(),))
+
+    def lookup_many(self, surnames):
+        """
+        Products for every surname, matching get_products: the artist name
+        starts with the surname (the API's artistName={}* query), contains
+        it as a word, and the product has details
+        """
+        tokens = sorted(set(surname.lower() for surname in surnames))
+        matches = {token: [] for token in tokens}
+        for start in range(0, len(tokens), 500):
+            chunk = tokens[start:start + 500]
+            rows = self.connection.execute(
+                'SELECT tokens.token, artist, format, image, url FROM tokens '
+                'JOIN products ON products.id = tokens.product '
+                'WHERE details AND tokens.token IN ({}) ORDER BY products.id'
+                .format(', '.join('?' * len(chunk))), chunk)
+            for token, artist, format, image, url in rows:
+                if artist.lower().startswith(token):
+                    matches[token].append((artist, format, image, url))
+        return {surname: [{'surname': surname, 'artist': artist, 'image': image,
+                           'format': format, 'url': url}
+                          for artist, format, image, url in matches[surname.lower()]]
+                for surname in surnames}
+
+    def lookup(self, surname):
+        return self.lookup_many([surname])[surname]
+
+
+if __name__ == '__main__':
+    # Load API keys from disk
+    with open(KEYS) as f:
+        keys = json.load(f)
+    ArtistIndex().ingest(keys['BEST_BUY'])
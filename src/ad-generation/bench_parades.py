@@ -0,0 +1,69 @@
+import argparse
+import glob
+import os
+import time
+import fetch
+import veterans
+
+
+FIXTURES = 'fixtures/parades'
+PARSERS = {'fast': veterans.parse_parades, 'soup': veterans.parse_parades_soup}
+
+
+def load_fixtures(directory=FIXTURES):
+    """Saved state pages, by state code"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, 'rb') as f:
+            pages[os.path.basename(path)[:-len('.html')]] = f.read()
+    return pages
+
+
+def save_pages(states, directory=FIXTURES):
+    """
+    Save the live vetfriends.com page of each state as a fixture, so the
+    parsers are checked against real markup as well as the synthetic pages
+    """
+    for state in states:
+        response = fetch.DEFAULT.get(veterans.PARADES_URL.format(state))
+        response.raise_for_status()
+        path = os.path.join(directory, '{}-saved.html'.format(state))
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print('Saved {} ({} bytes, {})'.format(path, len(response.content), response.encoding))
+
+
+def time_parser(parse, pages, repeats):
+    """Seconds per page for a parser, best of repeats passes over every page"""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for page in pages.values():
+            parse(page)
+        best = min(best, time.perf_counter() - started)
+    return best / len(pages)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark parsing of saved parade pages')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--fixtures', default=FIXTURES)
+    parser.add_argument('--save', nargs='+', default=[], metavar='STATE',
+                        help='First save the live page of each state as a fixture')
+    args = parser.parse_args()
+
+    save_pages(args.save, args.fixtures)
+    pages = load_fixtures(args.fixtures)
+
+    # Every parser must find the same parades before its speed means anything
+    for state, page in pages.items():
+        results = {name: parse(page) for name, parse in PARSERS.items()}
+        if results['fast'] != results['soup']:
+            raise SystemExit('Parsers disagree on {}: {}'.format(state, results))
+        print('{}: {} parades'.format(state, len(results['fast'])))
+
+    timings = {name: time_parser(parse, pages, args.repeats) for name, parse in PARSERS.items()}
+    for name, seconds in timings.items():
+        print('{:>5}: {:.3f} ms/page'.format(name, seconds * 1000))
+    print('fast is {:.0f}x soup; all 50 states parse in {:.1f} ms'.format(
+        timings['soup'] / timings['fast'], timings['fast'] * 50 * 1000))
@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+CACHE_PATH = 'cache.sqlite'
+
+# Seconds a cached response stays fresh, by host
+DAY = 24 * 60 * 60
+SOURCE_TTLS = {'api.open.fec.gov': DAY,
+               'api.bestbuy.com': DAY,
+               'api.nps.gov': 7 * DAY,
+               'www.vetfriends.com': DAY}
+DEFAULT_TTL = 30 * DAY
+MAX_BYTES = 500 * 2**20
+
+# Query parameters that carry credentials and never belong in a cache key
+SECRET_PARAMS = {'api_key', 'apikey'}
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a response is not in the cache"""
+
+
+def normalize_url(url):
+    """
+    Cache key for a URL: lower-case scheme and host, sorted query
+    parameters, and no API keys
+    """
+    parts = urlsplit(url)
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if name.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path,
+                       urlencode(query), ''))
+
+
+class ResponseCache:
+    """
+    Response bodies stored in SQLite, keyed by normalized URL. Entries
+    expire after their host's TTL, and the least recently used entries
+    are evicted once the cache grows past max_bytes. In offline mode
+    every cached entry is served regardless of age and nothing is fetched.
+    The database is opened, and created if need be, on first use.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttls=SOURCE_TTLS, max_bytes=MAX_BYTES, offline=False):
+        self.path = path
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.connection = None
+        self.total = 0
+
+    def connect(self):
+        """The database connection, opened on the first call. Hold self.lock."""
+        if self.connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                   'key TEXT PRIMARY KEY, body BLOB, size INTEGER, '
+                                   'fetched REAL, accessed REAL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                                   'ON responses (accessed)')
+            # Kept up to date by put, so it need not scan the table
+            self.total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses') \
+                                   .fetchone()[0]
+            self.connection = connection
+        return self.connection
+
+    def get(self, url):
+        """The cached body for a URL, or None if it is missing or stale"""
+        key = normalize_url(url)
+        ttl = self.ttls.get(urlsplit(key).netloc, DEFAULT_TTL)
+        now = time.time()
+        with self.lock, self.connect() as connection:
+            row = connection.execute('SELECT body, fetched FROM responses WHERE key = ?',
+                                     (key,)).fetchone()
+            if row is None or (not self.offline and now - row[1] > ttl):
+                return None
+            connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def put(self, url, body):
+        """Store a body, evicting least recently used entries to stay under max_bytes"""
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock, self.connect() as connection:
+            row = connection.execute('SELECT size FROM responses WHERE key = ?',
+                                     (key,)).fetchone()
+            connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                               (key, body, len(body), now, now))
+            self.total += len(body) - (row[0] if row else 0)
+            while self.total > self.max_bytes:
+                oldest = connection.execute('SELECT key, size FROM responses '
+                                            'ORDER BY accessed LIMIT 100').fetchall()
+                if not oldest:
+                    break
+                for old_key, size in oldest:
+                    if self.total <= self.max_bytes:
+                        break
+                    connection.execute('DELETE FROM responses WHERE key = ?', (old_key,))
+                    self.total -= size
@@ -0,0 +1,107 @@
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+import images
+import instrument
+import parks
+import products
+import veterans
+
+
+KEYS = 'KEYS'
+WORKERS = 4
+
+
+class Campaign:
+    """
+    One batch of ads: where the ads come from, which region's states they
+    target, the affiliation they lean towards, and the targeting noted in
+    the spreadsheet. name is the folder the ads are written to.
+
+    source is one of 'congress', 'gubernatorial', 'parks' or 'parades'.
+    region is 'Eastern' or 'Western'; gubernatorial campaigns cover every
+    state. offices lists FEC office codes for congress campaigns, and half
+    (1 or 2) picks which half of each candidate's products a
+    gubernatorial campaign uses.
+    """
+
+    def __init__(self, source, name, affiliation, targeting, region=None, offices=None, half=1):
+        self.source = source
+        self.name = name
+        self.affiliation = affiliation
+        self.targeting = targeting
+        self.region = region
+        self.offices = offices
+        self.half = half
+
+    def get_states(self, module):
+        return getattr(module, self.region.upper() + '_STATES')
+
+
+# Every campaign in the study
+CAMPAIGNS = [
+    Campaign('congress', 'Congressional Candidates (D) #1', 'Democrat', 'National',
+             region='Western', offices=['H', 'S']),
+    Campaign('gubernatorial', 'Gubernatorial Candidates (D) #1', 'Democrat', 'State', half=1),
+    Campaign('parks', 'Western U.S. National Parks', 'Democrat', 'State', region='Western'),
+    Campaign('parades', 'Western U.S. Parades', 'Republican', 'State', region='Western'),
+]
+
+
+def generate(campaign, keys):
+    """The source module, ads and folder for a campaign"""
+    if campaign.source == 'congress':
+        states = campaign.get_states(products)
+        candidates = products.get_congress_candidates(keys['FEC'], campaign.affiliation,
+                                                      states, campaign.offices)
+        ads, ad_dir = products.gen_congress_ads(keys['BEST_BUY'], candidates, campaign.affiliation,
+                                                campaign.name, states)
+        return products, ads, ad_dir
+    elif campaign.source == 'gubernatorial':
+        affiliation = {name: code for code, name in products.PARTIES.items()}[campaign.affiliation]
+        candidates = products.get_gubernatorial_candidates(affiliation)
+        ads, ad_dir = products.gen_gubernatorial_ads(keys['BEST_BUY'], candidates,
+                                                     campaign.affiliation, campaign.name,
+                                                     campaign.half)
+        return products, ads, ad_dir
+    elif campaign.source == 'parks':
+        ads, ad_dir = parks.gen_ads(keys['NPS_KEY'], campaign.name, campaign.get_states(parks))
+        return parks, ads, ad_dir
+    elif campaign.source == 'parades':
+        ads, ad_dir = veterans.gen_ads(campaign.name, campaign.get_states(veterans))
+        return veterans, ads, ad_dir
+    raise ValueError('Unknown campaign source: {}'.format(campaign.source))
+
+
+@instrument.timed
+def run_campaign(campaign, keys, pipeline):
+    """Generate a campaign's ads and write them to its folder"""
+    module, ads, ad_dir = generate(campaign, keys)
+    module.write_campaign(ads, ad_dir, campaign.affiliation, campaign.targeting, pipeline)
+    print('Wrote {} ads for {}'.format(len(ads), campaign.name))
+    return ad_dir
+
+
+def run(campaigns, keys, workers=WORKERS):
+    """
+    Run campaigns concurrently in one process. Every campaign shares the
+    same HTTP session, response cache and image pipeline, so a lookup or
+    image needed by several campaigns is only fetched once.
+    """
+    with images.ImagePipeline() as pipeline, ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(run_campaign, campaign, keys, pipeline) for campaign in campaigns]
+        return [job.result() for job in jobs]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the ads for every campaign in the study')
+    parser.add_argument('names', nargs='*', help='only run the campaigns with these names')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    # Load API keys from disk
+    with open(KEYS) as f:
+        keys = json.load(f)
+    campaigns = [c for c in CAMPAIGNS if not args.names or c.name in args.names]
+    run(campaigns, keys, args.workers)
+    instrument.write_report()
@@ -0,0 +1,233 @@
+import collections
+import json
+import os
+import email.utils
+import threading
+import time
+import instrument
+import requests
+from requests.adapters import HTTPAdapter
+from cache import CacheMiss, ResponseCache
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
+
+
+# Requests per second and burst size allowed for each API host.
+# FEC and NPS keys come from api.data.gov, which allows 1000 requests an hour;
+# Best Buy allows 5 queries per second.
+RATE_LIMITS = {'api.open.fec.gov': (1000 / 3600, 100),
+               'api.nps.gov': (1000 / 3600, 100),
+               'api.bestbuy.com': (5, 5),
+               'www.vetfriends.com': (2, 2)}
+DEFAULT_RATE_LIMIT = (10, 10)
+CONCURRENCY = 8
+
+# Retry failed requests up to MAX_RETRIES times, waiting BACKOFF * 2**attempt
+# seconds unless the server says how long to wait with Retry-After
+MAX_RETRIES = 5
+BACKOFF = 0.5
+TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Set OFFLINE=1 to serve every response from the cache without touching the network
+OFFLINE = os.environ.get('OFFLINE') == '1'
+
+
+class TokenBucket:
+    """Allow rate requests per second on average, in bursts of up to capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Fetcher:
+    """
+    Send requests from a pool of threads, holding each API host to its
+    rate limit. Results always come back in the order they were asked for.
+    Successful responses are stored in and served from cache, if given.
+    """
+
+    def __init__(self, rate_limits=RATE_LIMITS, concurrency=CONCURRENCY, cache=None,
+                 max_retries=MAX_RETRIES, backoff=BACKOFF):
+        self.rate_limits = rate_limits
+        self.concurrency = concurrency
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        # One pool of keep-alive connections per host, shared by every thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(*self.rate_limits.get(host, DEFAULT_RATE_LIMIT))
+            return self.buckets[host]
+
+    def get(self, url, stream=False):
+        """
+        GET a URL once its host's rate limit allows, retrying connection
+        errors and retryable statuses with exponential backoff. With
+        stream=True the body is left to be read from the response.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            self.get_bucket(url).acquire()
+            sent = time.perf_counter()
+            instrument.RUN.add(url, throttle_seconds=sent - started, retries=int(attempt > 0))
+            try:
+                response = self.session.get(url, timeout=TIMEOUT, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                instrument.RUN.add(url, errors=1)
+                if attempt == self.max_retries:
+                    raise
+                self.back_off(url, self.backoff * 2**attempt)
+                continue
+            # Streamed bodies are counted by whoever reads them
+            instrument.RUN.add_request(url, time.perf_counter() - sent,
+                                       0 if stream else len(response.content))
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            response.close()
+            self.back_off(url, retry_after(response) or self.backoff * 2**attempt)
+
+    def back_off(self, url, seconds):
+        instrument.RUN.add(url, backoff_seconds=seconds)
+        time.sleep(seconds)
+
+    def get_pages(self, url, page_count=lambda page: page['pagination']['pages']):
+        """
+        Yield every page of a paginated JSON API, starting from the first.
+        Later pages are requested concurrently and yielded in order as
+        they arrive.
+        """
+        first = self.get_json(url)
+        yield first
+        urls = [with_page(url, page) for page in range(2, page_count(first) + 1)]
+        yield from self.imap(self.get_json, urls)
+
+    def get_cached(self, url):
+        """
+        The cached body of a URL if the cache holds a fresh copy, or None.
+        In offline mode a URL that is not cached raises CacheMiss.
+        """
+        if self.cache is None:
+            return None
+        body = self.cache.get(url)
+        instrument.RUN.add(url, cache_hits=body is not None, cache_misses=body is None)
+        if body is None and self.cache.offline:
+            raise CacheMiss(url)
+        return body
+
+    def get_content(self, url):
+        """
+        The body of a URL, from the cache when it holds a fresh copy.
+        Error statuses, including those still failing after every retry,
+        raise requests.HTTPError.
+        """
+        body = self.get_cached(url)
+        if body is not None:
+            return body
+        response = self.get(url)
+        response.raise_for_status()
+        if self.cache is not None and response.status_code == 200:
+            self.cache.put(url, response.content)
+        return response.content
+
+    def get_json(self, url):
+        return json.loads(self.get_content(url))
+
+    def imap(self, function, items):
+        """
+        Apply function to every item on the thread pool, yielding results
+        in order. At most concurrency calls run ahead of the consumer, so
+        stopping early wastes little work.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = collections.deque()
+            try:
+                for item in items:
+                    pending.append(executor.submit(function, item))
+                    if len(pending) >= self.concurrency:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def map(self, function, items):
+        return list(self.imap(function, items))
+
+
+def retry_after(response):
+    """Seconds to wait according to a Retry-After header, or None"""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Malformed dates fall back to the usual backoff
+        return None
+    return max(0, date.timestamp() - time.time())
+
+
+def with_page(url, page):
+    """The URL with its page query parameter set"""
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name != 'page']
+    return urlunsplit(parts._replace(query=urlencode(query + [('page', page)])))
+
+
+DEFAULT = Fetcher(cache=ResponseCache(offline=OFFLINE))
+
+
+def get_json(url):
+    return DEFAULT.get_json(url)
+
+
+def get_content(url):
+    return DEFAULT.get_content(url)
+
+
+def get_pages(url):
+    return DEFAULT.get_pages(url)
+
+
+def get_all_pages(url):
+    return list(DEFAULT.get_pages(url))
+
+
+def imap(function, items):
+    return DEFAULT.imap(function, items)
+
+
+def map(function, items):
+    return DEFAULT.map(function, items)
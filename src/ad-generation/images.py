@@ -0,0 +1,130 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import fetch
+import instrument
+
+
+BLOB_DIR = '../ads/images'
+CHUNK_SIZE = 64 * 1024
+
+
+class ImagePipeline:
+    """
+    Download ad images on a pool of threads, streaming each body straight
+    to disk. Every URL is downloaded once per run, and identical images
+    are stored once in blob_dir, named by content hash, and hard-linked
+    into each ad folder that uses them.
+    """
+
+    def __init__(self, fetcher=None, blob_dir=None, workers=fetch.CONCURRENCY):
+        self.fetcher = fetcher or fetch.DEFAULT
+        self.blob_dir = blob_dir or BLOB_DIR
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.downloads = {}
+        self.jobs = []
+        self.stats = []
+        self.lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wait()
+
+    def get_blob(self, url):
+        """Start downloading a URL unless it already is, returning its future blob path"""
+        with self.lock:
+            if url not in self.downloads:
+                self.downloads[url] = self.executor.submit(self.download, url)
+            return self.downloads[url]
+
+    def download(self, url):
+        """
+        Stream one image into the blob store, returning its path. Images
+        are served from and stored in the fetcher's cache, if it has one.
+        """
+        started = time.perf_counter()
+        digest = hashlib.sha256()
+        body = self.fetcher.get_cached(url)
+        size = 0
+        # Downloaded bodies are kept for the cache, if there is one
+        chunks = [] if body is None and self.fetcher.cache is not None else None
+        tmp = tempfile.NamedTemporaryFile(dir=self.blob_dir, delete=False)
+        try:
+            with tmp:
+                for chunk in [body] if body is not None else self.stream(url):
+                    tmp.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if chunks is not None:
+                        chunks.append(chunk)
+        except BaseException:
+            # Leave no partial download behind in the blob store
+            os.remove(tmp.name)
+            raise
+        if chunks is not None:
+            self.fetcher.cache.put(url, b''.join(chunks))
+        blob = os.path.join(self.blob_dir, digest.hexdigest() + '.jpg')
+        if os.path.exists(blob):
+            os.remove(tmp.name)
+        else:
+            os.chmod(tmp.name, 0o644)
+            os.replace(tmp.name, blob)
+        seconds = time.perf_counter() - started
+        with self.lock:
+            self.stats.append((url, size, seconds))
+        if body is None:
+            instrument.RUN.add(url, bytes=size)
+            print('Downloaded {} ({} bytes in {:.2f}s)'.format(url, size, seconds))
+        return blob
+
+    def stream(self, url):
+        """The body of a URL, in chunks as they arrive"""
+        with self.fetcher.get(url, stream=True) as response:
+            response.raise_for_status()
+            yield from response.iter_content(CHUNK_SIZE)
+
+    def link(self, blob, destination):
+        """Hard-link a blob into an ad folder, copying where links are not supported"""
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(blob, destination)
+        except OSError:
+            shutil.copyfile(blob, destination)
+
+    def write_image(self, url, destination):
+        """
+        Queue an image to be written to destination once it is downloaded,
+        returning a future that completes when it has been
+        """
+        done = Future()
+
+        def link(blob):
+            try:
+                self.link(blob.result(), destination)
+                done.set_result(destination)
+            except Exception as e:
+                done.set_exception(e)
+
+        self.get_blob(url).add_done_callback(link)
+        self.jobs.append(done)
+        return done
+
+    def wait(self):
+        """Wait for every queued image, then report what was downloaded"""
+        try:
+            for job in self.jobs:
+                job.result()
+        finally:
+            self.executor.shutdown()
+        total = sum(size for url, size, seconds in self.stats)
+        slowest = max([seconds for url, size, seconds in self.stats], default=0)
+        print('Downloaded {} images, {} bytes, slowest {:.2f}s, for {} ad images'.format(
+            len(self.stats), total, slowest, len(self.jobs)))
@@ -0,0 +1,104 @@
+import bisect
+import collections
+import functools
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+
+REPORT = 'run-report.json'
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')]
+
+
+class Recorder:
+    """
+    Timings and counters for one generation run: how long each stage took,
+    and for each host the requests sent, their latency, bytes received,
+    time spent waiting on the rate limit or backing off, and cache use.
+    Safe to update from many threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.spans = collections.defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        self.hosts = collections.defaultdict(lambda: {
+            'requests': 0, 'retries': 0, 'errors': 0, 'bytes': 0,
+            'latency_seconds': 0.0, 'latency_histogram': [0] * len(LATENCY_BUCKETS),
+            'throttle_seconds': 0.0, 'backoff_seconds': 0.0,
+            'cache_hits': 0, 'cache_misses': 0})
+
+    def add_span(self, name, seconds):
+        with self.lock:
+            span = self.spans[name]
+            span['calls'] += 1
+            span['seconds'] += seconds
+            span['max_seconds'] = max(span['max_seconds'], seconds)
+
+    def add(self, url, **counts):
+        """Add to a host's counters, given any URL on that host"""
+        with self.lock:
+            host = self.hosts[urlparse(url).netloc]
+            for name, value in counts.items():
+                host[name] += value
+
+    def add_request(self, url, seconds, size=0):
+        """Record one response received from url, with size bytes of body if known"""
+        with self.lock:
+            host = self.hosts[urlparse(url).netloc]
+            host['requests'] += 1
+            host['bytes'] += size
+            host['latency_seconds'] += seconds
+            host['latency_histogram'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def get_report(self):
+        with self.lock:
+            hosts = {}
+            for name, host in self.hosts.items():
+                lookups = host['cache_hits'] + host['cache_misses']
+                hosts[name] = dict(host,
+                                   mean_latency_seconds=host['latency_seconds'] / host['requests']
+                                   if host['requests'] else None,
+                                   cache_hit_rate=host['cache_hits'] / lookups if lookups else None)
+                # [upper bound in seconds, requests], the last bucket unbounded
+                hosts[name]['latency_histogram'] = [
+                    [None if bound == float('inf') else bound, count]
+                    for bound, count in zip(LATENCY_BUCKETS, host['latency_histogram'])]
+            spans = {name: dict(span, mean_seconds=span['seconds'] / span['calls'])
+                     for name, span in self.spans.items()}
+            return {'started': self.started, 'wall_seconds': time.time() - self.started,
+                    'spans': spans, 'hosts': hosts}
+
+
+RUN = Recorder()
+
+
+def timed(function):
+    """Record every call of a function as a span named module.function"""
+    name = function.__module__ + '.' + function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            RUN.add_span(name, time.perf_counter() - started)
+    return wrapper
+
+
+def write_report(filepath=REPORT):
+    """
+    Write what this run recorded as JSON. Spans nest, so a stage's time
+    includes the time of the stages it calls.
+    """
+    report = RUN.get_report()
+    with open(filepath, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    slowest = sorted(report['spans'].items(), key=lambda item: -item[1]['seconds'])[:5]
+    print('Run took {:.1f}s; slowest stages: {}'.format(report['wall_seconds'], ', '.join(
+        '{} {:.1f}s'.format(name, span['seconds']) for name, span in slowest)))
+    print('Timing report written to', filepath)
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+
+MANIFEST = 'manifest.json'
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Record of the files generated in an ad folder, with a hash of the
+    inputs each was generated from and a hash of its content. A file is
+    only rewritten when its inputs change or it no longer matches what
+    was written, so reruns leave unchanged ads untouched.
+    """
+
+    def __init__(self, ad_dir):
+        self.ad_dir = ad_dir
+        self.path = os.path.join(ad_dir, MANIFEST)
+        self.entries = {}
+        self.settings = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            self.entries = saved['files']
+            self.settings = saved['settings']
+        self.seen = set()
+
+    def relative(self, path):
+        return os.path.relpath(path, self.ad_dir)
+
+    def is_current(self, path, inputs):
+        """Whether path exists and was generated from these inputs"""
+        entry = self.entries.get(self.relative(path))
+        return entry is not None and entry['input'] == hash_bytes(inputs.encode()) and \
+            os.path.exists(path) and hash_file(path) == entry['content']
+
+    def record(self, path, inputs, content=None):
+        """
+        Note that path was generated from inputs. The content hash is
+        computed from the file on save unless the content is given.
+        """
+        self.entries[self.relative(path)] = {
+            'input': hash_bytes(inputs.encode()),
+            'content': None if content is None else hash_bytes(content)}
+        self.seen.add(self.relative(path))
+
+    def write_text(self, path, text, inputs=None):
+        """Write text to path unless it is already current. Returns whether it was written."""
+        inputs = text if inputs is None else inputs
+        written = not self.is_current(path, inputs)
+        if written:
+            with open(path, 'w', newline='') as f:
+                f.write(text)
+        self.record(path, inputs, text.encode())
+        return written
+
+    def prune(self, prefix=''):
+        """Delete files under prefix that earlier runs wrote and this run did not"""
+        for relative in list(self.entries):
+            if relative.startswith(prefix) and relative not in self.seen:
+                path = os.path.join(self.ad_dir, relative)
+                if os.path.exists(path):
+                    os.remove(path)
+                del self.entries[relative]
+
+    def save(self):
+        for relative, entry in self.entries.items():
+            if entry['content'] is None:
+                entry['content'] = hash_file(os.path.join(self.ad_dir, relative))
+        with open(self.path, 'w') as f:
+            json.dump({'settings': self.settings, 'files': self.entries}, f, indent=2, sort_keys=True)
@@ -1,14 +1,13 @@
 import os
 import json
-import requests
-import shutil
-import random
-import csv
+import fetch
+import images
+import instrument
+import writer
 
 
 KEYS = 'KEYS'
 BASE_DIR = '../ads/issues/Democrat'
-DAYS = 14
 
 PARK_QUERY = 'https://api.nps.gov/api/v1/parks?designation=National%20Park' \
              '&q=National%20Park&stateCode={}&fields=images&limit=40&api_key={}'
@@ -22,7 +21,20 @@ WESTERN_STATES = ['OR', 'WA', 'NV', 'UT', 'ID', 'CA']
 EASTERN_KEYWORDS = 'east coast, national parks, nature'
 WESTERN_KEYWORDS = 'west coast, national parks, nature'
 
+# Spreadsheet columns, and what the ads reference
+CSV_HEADER = ['Ad Poster ID', 'Date', 'Ad ID', 'Platform', 'Ad' \
+              'Name', 'Text', 'Location', 'Left or right' \
+              'leaning?', 'Product or Issue-reference?',
+              'State or National candidate/issue?', 'Ad' \
+              'Permitted (Y/N)', 'Platform Verified My' \
+              'Account Before This Point (Y/N)',
+              'Platform listed transparency info with ad' \
+              '(Y/N)', '48 Hour Results', '48 Hour Reach',
+              '48 Hour Impressions']
+REFERENCE = 'Product'
+
   
+@instrument.timed
 def get_parks (nps_key, states):
     """
     Get a list of national parks for each state from the National Park Service API
@@ -30,9 +42,8 @@ def get_parks (nps_key, states):
     """
     parks = []
     names = []
-    for state in states:
-        query = PARK_QUERY.format(state, nps_key)
-        response = requests.get(query).json()
+    queries = [PARK_QUERY.format(state, nps_key) for state in states]
+    for state, response in zip(states, fetch.map(fetch.get_json, queries)):
         data = response['data']
         for d in data:
             name = d['fullName']
@@ -49,14 +60,12 @@ def get_parks (nps_key, states):
     return parks
 
 
+@instrument.timed
 def gen_ads (nps_key, dir_name, states):
     """Main code for generating ads"""
     # Create the directory for the ad data
     ad_dir = BASE_DIR + '/' + dir_name
-    if not os.path.exists(ad_dir):
-        os.makedirs(ad_dir)
-    else:
-        shutil.rmtree(ad_dir)
+    os.makedirs(ad_dir, exist_ok=True)
         
     ads = []
     parks = get_parks(nps_key, states)
@@ -79,71 +88,11 @@ def gen_ads (nps_key, dir_name, states):
     return (ads, ad_dir)
 
 
-def write_ads (ads, ad_dir):
-    """Write generated ads to disk"""
-    # Randomly choose days where 2 ads will be placed
-    double_days = random.sample(range(1,15), 6)
-    print('Days where two ads will be placed:', double_days)
-
-    i = 0
-    for day in range(1, DAYS + 1):
-        # Make a subdirectory for eacb day of ad placements        
-        day_dir = ad_dir + '/' + 'Day {}'.format(day)
-        if not os.path.exists(day_dir):
-            os.makedirs(day_dir)
-        else:
-            shutil.rmtree(day_dir)
-
-        # Write an ad to disk
-        write_one_ad(ads[i], day_dir)
-        i += 1
-
-        # If a double day, write another ad
-        if day in double_days:
-            write_one_ad(ads[i], day_dir)
-            i += 1
-
-
-def write_one_ad(ad_tuple, day_dir):
-    """Write a single ad to disk"""
-    # Write the ad to disk only if the ad image exists
-    name = ad_tuple[0]
-    ad = ad_tuple[1]
-    image_url = ad_tuple[2]
-    img_data = requests.get(image_url).content
-
-    # Write the image to disk
-    with open(day_dir + '/' + name + '.jpg', 'wb') as img:
-        img.write(img_data)
-
-    # Write the ad text to disk
-    with open(day_dir + '/' + name + '.txt', 'w') as txt:
-        txt.write(ad)
-    print(ad + '\n')
-
-
-def write_csv(ads, ad_dir, affiliation, targeting):
-    """Write the CSV template to disk for participants to fill out"""
-    with open(ad_dir + '/' + 'spreadsheet.csv', 'w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile, delimiter='|',
-                                quotechar='\'', quoting=csv.QUOTE_MINIMAL)  
-
-        # Write the header, and then write a row for each ad (with some columns to be filled in later)
-        csvwriter.writerow(['Ad Poster ID', 'Date', 'Ad ID', 'Platform', 'Ad' \
-                            'Name', 'Text', 'Location', 'Left or right' \
-                            'leaning?', 'Product or Issue-reference?',
-                            'State or National candidate/issue?', 'Ad' \
-                            'Permitted (Y/N)', 'Platform Verified My' \
-                            'Account Before This Point (Y/N)',
-                            'Platform listed transparency info with ad' \
-                            '(Y/N)', '48 Hour Results', '48 Hour Reach',
-                            '48 Hour Impressions'])
+def write_campaign(ads, ad_dir, affiliation, targeting, pipeline):
+    """Write the ads and the spreadsheet for participants to fill out"""
+    writer.write_ads(ads, ad_dir, pipeline)
+    writer.write_csv(ads, ad_dir, affiliation, targeting, CSV_HEADER, REFERENCE)
 
-        for ad in ads:
-            csvwriter.writerow(['', '', '', 'Facebook', ad[0], ad[1], ad[3], affiliation,
-                                'Product', targeting, '', '', '', '', '', ''])
-            csvwriter.writerow(['', '', '', 'Google', ad[0], ad[1], ad[3], affiliation,
-                                'Product', targeting, '', '', '', '', '', ''])            
 
 if __name__ == '__main__':
     # Load API keys from disk
@@ -155,5 +104,6 @@ if __name__ == '__main__':
     ad_tuple = gen_ads(nps_key, 'Western U.S. National Parks', WESTERN_STATES)
     ads = ad_tuple[0]
     ad_dir = ad_tuple[1]
-    write_ads(ads, ad_dir)
-    write_csv(ads, ad_dir, 'Democrat', 'State')
+    with images.ImagePipeline() as pipeline:
+        write_campaign(ads, ad_dir, 'Democrat', 'State', pipeline)
+    instrument.write_report()
@@ -0,0 +1,146 @@
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+import cache
+import fetch
+
+
+REGISTRY_PATH = 'candidates.sqlite'
+GUBERNATORIAL_CSV = 'gubernatorial.csv'
+
+# Every candidate for an office in a state, of any party
+CANDIDATE_QUERY = 'https://api.open.fec.gov/v1/candidates/search/' \
+                  '?candidate_status=C&election_year=2018&sort=district' \
+                  '&per_page=100&api_key={}&state={}&office={}'
+
+# Affiliations used to query the registry, by FEC party code or CSV label
+AFFILIATIONS = {'DEM': 'Democrat', 'REP': 'Republican',
+                '(D)': 'Democrat', '(R)': 'Republican'}
+
+CITATION = re.compile(r'\[[0-9]*\]')
+CANDIDATE = re.compile(r'([^()]*?)\s*(\([^()]*\))')
+
+
+def parse_gubernatorial_row(row):
+    """
+    Every (surname, party) listed in a row of gubernatorial.csv, in order.
+    Candidates look like 'Gavin Newsom (D)[12]'.
+    """
+    candidates = CITATION.sub('', row[5])
+    return [(name.split()[-1], party) for name, party in CANDIDATE.findall(candidates)
+            if name.split()]
+
+
+class CandidateRegistry:
+    """
+    Candidates from the FEC API and gubernatorial.csv in one SQLite table,
+    indexed for lookups by state, office, party and surname. Each source
+    is ingested once, and again only when it changes: the CSV when its
+    modification time does, FEC results once they are older than the
+    FEC cache TTL. Queries read the table.
+    """
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            # rank orders a party's candidates within a state for one source
+            self.connection.execute('CREATE TABLE IF NOT EXISTS candidates ('
+                                    'id INTEGER PRIMARY KEY, source TEXT, surname TEXT, '
+                                    'party TEXT, affiliation TEXT, state TEXT, district TEXT, '
+                                    'office TEXT, rank INTEGER)')
+            for column in ('state', 'office', 'affiliation', 'surname'):
+                self.connection.execute('CREATE INDEX IF NOT EXISTS candidates_{0} '
+                                        'ON candidates ({0})'.format(column))
+            self.connection.execute('CREATE TABLE IF NOT EXISTS sources ('
+                                    'source TEXT PRIMARY KEY, version TEXT)')
+
+    def is_loaded(self, source, version=''):
+        with self.lock:
+            row = self.connection.execute('SELECT version FROM sources WHERE source = ?',
+                                          (source,)).fetchone()
+        return row is not None and row[0] == version
+
+    def is_fresh(self, source, ttl):
+        """Whether source was fetched, with its fetch time as version, in the last ttl seconds"""
+        with self.lock:
+            row = self.connection.execute('SELECT version FROM sources WHERE source = ?',
+                                          (source,)).fetchone()
+        try:
+            return row is not None and time.time() - float(row[0]) <= ttl
+        except ValueError:
+            return False
+
+    def replace(self, source, candidates, version=''):
+        """Replace every candidate from a source with (surname, party, state, district, office)"""
+        ranks = {}
+        rows = []
+        for surname, party, state, district, office in candidates:
+            affiliation = AFFILIATIONS.get(party, party)
+            rank = ranks.get((state, affiliation), 0)
+            ranks[(state, affiliation)] = rank + 1
+            rows.append((source, surname, party, affiliation, state, district, office, rank))
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM candidates WHERE source = ?', (source,))
+            self.connection.executemany('INSERT INTO candidates (source, surname, party, '
+                                        'affiliation, state, district, office, rank) '
+                                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.connection.execute('INSERT OR REPLACE INTO sources VALUES (?, ?)',
+                                    (source, version))
+
+    def load_congress(self, api_key, states, offices, refresh=False,
+                      ttl=cache.SOURCE_TTLS['api.open.fec.gov']):
+        """
+        Ingest candidates of every party for each state and office from the
+        OpenFEC API, skipping pairs fetched in the last ttl seconds
+        """
+        pairs = [(state, office) for office in offices for state in states
+                 if refresh or not self.is_fresh('fec:{}:{}'.format(state, office), ttl)]
+        queries = [CANDIDATE_QUERY.format(api_key, state, office) for state, office in pairs]
+        for (state, office), pages in zip(pairs, fetch.imap(fetch.get_all_pages, queries)):
+            candidates = [(candidate['name'].split(', ')[0], candidate['party'], state,
+                           candidate['district'], office)
+                          for response in pages for candidate in response['results']]
+            self.replace('fec:{}:{}'.format(state, office), candidates, str(time.time()))
+
+    def load_gubernatorial(self, path=GUBERNATORIAL_CSV):
+        """Ingest every candidate in the CSV, again only if the file has changed"""
+        version = str(os.stat(path).st_mtime_ns)
+        if self.is_loaded('gubernatorial', version):
+            return
+        candidates = []
+        with open(path, 'r') as csvfile:
+            for row in csv.reader(csvfile):
+                for surname, party in parse_gubernatorial_row(row):
+                    candidates.append((surname, party, row[0], 'n/a', 'Governor'))
+        self.replace('gubernatorial', candidates, version)
+
+    def find(self, affiliation=None, states=None, offices=None, surname=None, first=False):
+        """
+        Candidates matching every given filter as (surname, party, state,
+        district, office) tuples, in the order they were ingested. With
+        first=True, only each state's first candidate of a party per source.
+        """
+        clauses = []
+        params = []
+        if affiliation is not None:
+            clauses.append('affiliation = ?')
+            params.append(affiliation)
+        for column, values in (('state', states), ('office', offices)):
+            if values is not None:
+                values = list(values)
+                clauses.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+                params.extend(values)
+        if surname is not None:
+            clauses.append('surname = ? COLLATE NOCASE')
+            params.append(surname)
+        if first:
+            clauses.append('rank = 0')
+        query = 'SELECT surname, party, state, district, office FROM candidates'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        with self.lock:
+            return self.connection.execute(query + ' ORDER BY id', params).fetchall()
@@ -1,15 +1,14 @@
-import csv
+import codecs
+import html
 import os
-import json
-import requests
-import shutil
-import random
-from bs4 import BeautifulSoup
+import re
+import fetch
+import instrument
+import writer
 
 
 KEYS = 'KEYS'
 BASE_DIR = '../ads/issues/Republican'
-DAYS = 14
 
 PARADES_URL = 'https://www.vetfriends.com/parades/directory.cfm?state={}'
 
@@ -23,31 +22,114 @@ WESTERN_STATES = ['OR', 'WA', 'NV', 'UT', 'ID', 'CA']
 EASTERN_KEYWORDS = 'east coast, veterans day, parades'
 WESTERN_KEYWORDS = 'west coast, veterans day, parades'
 
-
-def get_parades (states):
-    """Get a list of Veteran's Day parades from www.vetfriends.com"""
-    # Scrape the name of each parade
+# Spreadsheet columns, and what the ads reference
+CSV_HEADER = ['Ad Poster ID', 'Date', 'Ad ID', 'Folder', 'Platform', 'Ad ' \
+              'Name', 'Text', 'Location', 'Left or right' \
+              'leaning?', 'Product or Issue-reference?',
+              'State or National candidate/issue?', 'Ad ' \
+              'Permitted (Y/N)', 'Platform Attempted to Verify My ' \
+              'Account Before This Point (Y/N)',
+              'Platform successfully verified my account before this point (Y/N) ',
+              'Platform listed transparency info with ad' \
+              '(Y/N)', 'Ad Removed Within 48 Hours (Y/N)',
+              '48 Hour Results', '48 Hour Reach', '48 Hour Impressions']
+REFERENCE = 'Issue'
+
+# Each parade is listed in a table with these attributes, its name centered inside
+EVENT_ATTRIBUTES = {'cellpadding': '5', 'cellspacing': '5', 'width': '100%'}
+TABLE_TAG = re.compile(r'<table\b([^>]*)>', re.IGNORECASE)
+ATTRIBUTE = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+TABLE_END = re.compile(r'</table\s*>', re.IGNORECASE)
+CENTER = re.compile(r'<center\b[^>]*>(.*?)</center>', re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r'<[^>]*>')
+
+# The charset a page declares in a <meta> tag, which HTML requires in its
+# first 1024 bytes
+META_CHARSET = re.compile(rb'<meta\b[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+@instrument.timed
+def get_parades (states, parser='fast'):
+    """
+    Get a list of Veteran's Day parades from www.vetfriends.com, fetching
+    every state's page concurrently. parser is 'fast', which only looks at
+    the event tables, or 'soup', which parses the whole page with
+    BeautifulSoup.
+    """
+    parse = {'fast': parse_parades, 'soup': parse_parades_soup}[parser]
+    queries = [PARADES_URL.format(state) for state in states]
     parades = []
-    for state in states:
-        # GET the webpage for Veterans Day parades in a given state
-        query = PARADES_URL.format(state)    
-        response = requests.get(query).content
-        soup = BeautifulSoup(response, 'html.parser')        
-        events = soup.find_all('table', {'cellpadding': '5', 'cellspacing': '5', 'width': '100%'})
-        for event in events:
-            name = event.center.string.title().split('/')[0].strip()
+    for state, response in zip(states, fetch.map(fetch.get_content, queries)):
+        for name in parse(response):
             parades.append((name, state))
     return parades
 
 
+def parade_name(text):
+    return text.title().split('/')[0].strip()
+
+
+def decode_page(page, encoding=None):
+    """
+    The text of a page body. Unless encoding is given, such as the charset
+    of the response it came in, the page is decoded as its byte order mark
+    or <meta> charset declares, and otherwise as UTF-8 if it is valid UTF-8
+    and Windows-1252 if not, as browsers do.
+    """
+    if isinstance(page, str):
+        return page
+    if encoding is None:
+        if page.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        else:
+            declared = META_CHARSET.search(page[:1024])
+            encoding = declared.group(1).decode('ascii') if declared else None
+    if encoding is not None:
+        try:
+            return page.decode(encoding, errors='replace')
+        except LookupError:
+            pass
+    try:
+        return page.decode('utf-8')
+    except UnicodeDecodeError:
+        return page.decode('cp1252', errors='replace')
+
+
+def parse_parades(page, encoding=None):
+    """
+    Scrape the name of each parade on a state's page, decoded by
+    decode_page. Only the event tables' opening tags and the first
+    <center> inside each, before the next </table>, are examined, rather
+    than parsing the whole document.
+    """
+    page = decode_page(page, encoding)
+    names = []
+    for table in TABLE_TAG.finditer(page):
+        attributes = {match.group(1).lower(): match.group(2) or match.group(3) or match.group(4) or ''
+                      for match in ATTRIBUTE.finditer(table.group(1))}
+        if any(attributes.get(name) != value for name, value in EVENT_ATTRIBUTES.items()):
+            continue
+        end = TABLE_END.search(page, table.end())
+        center = CENTER.search(page, table.end(), end.start() if end else len(page))
+        if center:
+            names.append(parade_name(html.unescape(TAG.sub('', center.group(1)))))
+    return names
+
+
+def parse_parades_soup(page, encoding=None):
+    """Scrape the name of each parade by parsing the whole page"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(decode_page(page, encoding), 'html.parser')
+    events = soup.find_all('table', EVENT_ATTRIBUTES)
+    return [parade_name(event.center.string) for event in events]
+
+
+@instrument.timed
 def gen_ads (dir_name, states):
     """Generate a Veteran's Day ad for parades from each state"""
     # Create the directory for the ad data
     ad_dir = BASE_DIR + '/' + dir_name
-    if not os.path.exists(ad_dir):
-        os.makedirs(ad_dir)
-    else:
-        shutil.rmtree(ad_dir)
+    os.makedirs(ad_dir, exist_ok=True)
     
     ads = []
     parades = get_parades(states)
@@ -72,79 +154,17 @@ def gen_ads (dir_name, states):
     return (ads, ad_dir)
 
 
-def write_ads (ads, ad_dir):
-    """Write the ads to disk"""
-    # Randomly choose days where 2 ads will be placed
-    double_days = random.sample(range(1,15), 6)
-    print('Days where two ads will be placed:', double_days)
+def write_campaign(ads, ad_dir, affiliation, targeting, pipeline=None):
+    """Write the ads and the spreadsheet, listing the folder each ad was written to"""
+    # Parade ads have no images
+    folders = writer.write_ads(ads, ad_dir)
+    writer.write_csv(ads, ad_dir, affiliation, targeting, CSV_HEADER, REFERENCE, folders)
 
-    i = 0
-    folders = []
-    for day in range(1, DAYS + 1):
-        # Make a subdirectory for eacb day of ad placements        
-        day_dir = ad_dir + '/' + 'Day {}'.format(day)
-        if not os.path.exists(day_dir):
-            os.makedirs(day_dir)
-        else:
-            shutil.rmtree(day_dir)
-
-        # Write an ad to disk
-        write_one_ad(ads[i], day_dir)
-        folders.append((ads[i], day_dir))        
-        i += 1
-
-        # If a double day, write another ad
-        if day in double_days:
-            write_one_ad(ads[i], day_dir)
-            folders.append((ads[i], day_dir))
-            i += 1
-    return folders
-
-
-def write_one_ad(ad_tuple, day_dir):
-    """Write a single ad to disk"""
-    # Write the ad to disk only if the ad image exists
-    name = ad_tuple[0]
-    ad = ad_tuple[1]
-
-    # Write the ad text to disk
-    with open(day_dir + '/' + name + '.txt', 'w') as txt:
-        txt.write(ad)
-    print(ad + '\n')
-
-
-def write_csv(ad_tuples, ad_dir, affiliation, targeting):
-    """Write a CSV template to disk for participants to fill out"""
-    with open(ad_dir + '/' + 'spreadsheet.csv', 'w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile, delimiter='|',
-                                quotechar='\'', quoting=csv.QUOTE_MINIMAL)  
-            
-        # Write the header, and then write a row for each ad (with some columns to be filled in later)
-        csvwriter.writerow(['Ad Poster ID', 'Date', 'Ad ID', 'Folder', 'Platform', 'Ad ' \
-                            'Name', 'Text', 'Location', 'Left or right' \
-                            'leaning?', 'Product or Issue-reference?',
-                            'State or National candidate/issue?', 'Ad ' \
-                            'Permitted (Y/N)', 'Platform Attempted to Verify My ' \
-                            'Account Before This Point (Y/N)',
-                            'Platform successfully verified my account before this point (Y/N) ',                
-                            'Platform listed transparency info with ad' \
-                            '(Y/N)', 'Ad Removed Within 48 Hours (Y/N)',
-                            '48 Hour Results', '48 Hour Reach', '48 Hour Impressions'])
-
-        for ad_tuple in ad_tuples:
-            ad = ad_tuple[0]
-            day_dir = ad_tuple[1]
-            csvwriter.writerow(['', '', '', day_dir, 'Facebook', ad[0], ad[1], ad[3], affiliation,
-                                'Issue', targeting, '', '', '', '', '', '', '', ''])
-            csvwriter.writerow(['', '', '', day_dir, 'Google', ad[0], ad[1], ad[3], affiliation,
-                                'Issue', targeting, '', '', '', '', '', '', '', ''])
 
 if __name__ == '__main__':
     # Generate ads for parks that reference climate change
     ad_tuple = gen_ads('Western U.S. Parades', WESTERN_STATES)
     ads = ad_tuple[0]
     base_dir = ad_tuple[1]
-
-    ads_with_folders = write_ads(ads, base_dir)
-    write_csv(ads_with_folders, base_dir, 'Republican', 'State')
-    
+    write_campaign(ads, base_dir, 'Republican', 'State')
+    instrument.write_report()
@@ -0,0 +1,102 @@
+import csv
+import io
+import os
+import random
+import instrument
+import manifest
+
+
+DAYS = 14
+
+# Each ad gets one spreadsheet row per platform it is placed on
+PLATFORMS = ['Facebook', 'Google']
+
+
+@instrument.timed
+def write_ads(ads, ad_dir, pipeline=None, filename=str):
+    """
+    Write one ad per day, two on randomly chosen days, each into its own
+    day subdirectory. Images are queued on pipeline, if given. Returns
+    (ad, day_dir) for every ad written.
+    """
+    # Keep the days chosen by earlier runs, so unchanged ads stay in their folders
+    ad_manifest = manifest.Manifest(ad_dir)
+    if 'double_days' not in ad_manifest.settings:
+        # Randomly choose days where 2 ads will be placed
+        ad_manifest.settings['double_days'] = random.sample(range(1,15), 6)
+    double_days = ad_manifest.settings['double_days']
+    print('Days where two ads will be placed:', double_days)
+
+    i = 0
+    folders = []
+    images = []
+    for day in range(1, DAYS + 1):
+        # Make a subdirectory for eacb day of ad placements
+        day_dir = ad_dir + '/' + 'Day {}'.format(day)
+        os.makedirs(day_dir, exist_ok=True)
+
+        # Write an ad to disk, and another if a double day
+        for _ in range(2 if day in double_days else 1):
+            images.extend(write_one_ad(ads[i], day_dir, pipeline, ad_manifest, filename))
+            folders.append((ads[i], day_dir))
+            i += 1
+
+    # Images must be on disk before the manifest can hash them
+    for image in images:
+        image.result()
+
+    # Remove ads that are no longer part of this batch
+    ad_manifest.prune('Day ')
+    ad_manifest.save()
+    return folders
+
+
+@instrument.timed
+def write_one_ad(ad_tuple, day_dir, pipeline, ad_manifest, filename=str):
+    """
+    Write a single ad to disk, queueing its image on the pipeline. Files
+    that are unchanged since the last run are left alone. Returns the
+    image jobs queued.
+    """
+    name = filename(ad_tuple[0])
+    ad = ad_tuple[1]
+    image_url = ad_tuple[2]
+
+    # Write the image to disk, for ads that have one
+    jobs = []
+    if pipeline is not None and image_url != 'n/a':
+        image_path = day_dir + '/' + name + '.jpg'
+        if not ad_manifest.is_current(image_path, image_url):
+            jobs.append(pipeline.write_image(image_url, image_path))
+        ad_manifest.record(image_path, image_url)
+
+    # Write the ad text to disk
+    ad_manifest.write_text(day_dir + '/' + name + '.txt', ad)
+    print(ad + '\n')
+    return jobs
+
+
+@instrument.timed
+def write_csv(ads, ad_dir, affiliation, targeting, header, reference, folders=None):
+    """
+    Write a CSV template to disk for participants to fill out, with a row
+    per ad and platform. If folders from write_ads are given, only the
+    ads written are listed, each with its day folder.
+    """
+    csvfile = io.StringIO()
+    csvwriter = csv.writer(csvfile, delimiter='|',
+                            quotechar='\'', quoting=csv.QUOTE_MINIMAL)
+
+    # Write the header, and then write a row for each ad (with some columns to be filled in later)
+    csvwriter.writerow(header)
+    rows = folders if folders is not None else [(ad, None) for ad in ads]
+    for ad, day_dir in rows:
+        for platform in PLATFORMS:
+            row = ['', '', ''] + ([day_dir] if folders is not None else []) + \
+                  [platform, ad[0], ad[1], ad[3], affiliation, reference, targeting]
+            csvwriter.writerow(row + [''] * (len(header) - len(row)))
+
+    # Only rewrite the spreadsheet if its contents changed
+    ad_manifest = manifest.Manifest(ad_dir)
+    ad_manifest.write_text(ad_dir + '/' + 'spreadsheet.csv', csvfile.getvalue())
+    ad_manifest.save()
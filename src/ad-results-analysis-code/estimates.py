@@ -0,0 +1,99 @@
+import csv
+import os
+import sys
+import numpy as np
+from results import load_results
+
+# The interval code is shared with the power analysis
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "power-analysis-code"))
+from intervals import confint
+
+
+ALL = "All"
+
+# Groupings reported by analysis-10.2018.R
+PSP_KEYS = ["platform", "persona", "election", "party", "ad.type"]
+
+
+def count_cells(results, keys):
+    """
+    Attempts and permitted attempts for every combination of the levels of
+    keys, as two arrays with one axis per key, from one pass over the rows
+    """
+    shape = tuple(len(results.levels[key]) for key in keys)
+    cells = np.ravel_multi_index([results.columns[key] for key in keys], shape)
+    size = int(np.prod(shape))
+    trials = np.bincount(cells, minlength=size).reshape(shape)
+    successes = np.bincount(cells, weights=results.columns["permitted"],
+                            minlength=size).astype(np.int64).reshape(shape)
+    return trials, successes
+
+
+def estimate_rates(results, keys, rollups=(), conf_level=0.95, method="wilson"):
+    """
+    Publication rate of every group of attempts sharing the levels of keys,
+    with confidence intervals by method, one of intervals.METHODS, as a
+    table of columns, identical to those the power analysis computes for
+    the same counts. Each key in rollups is also summed over and reported
+    with the level "All", alone and together with the other rollups, so
+    rollups=["persona"] gives both the per-persona rates and the rates
+    across all personas. Groups with no attempts are left out.
+    """
+    trials, successes = count_cells(results, keys)
+    levels = [results.levels[key] for key in keys]
+    return tabulate_rates(trials, successes, levels, keys, rollups, conf_level, method)
+
+
+def tabulate_rates(trials, successes, levels, keys, rollups=(), conf_level=0.95,
+                   method="wilson"):
+    """
+    The table of estimate_rates from arrays of attempts and permitted
+    attempts with one axis per key, whose entries are named by levels
+    """
+    levels = [np.asarray(level).astype(object) for level in levels]
+    rolled = [keys.index(key) for key in rollups]
+
+    # Every subset of the rollup keys, from none to all of them
+    tables = []
+    for mask in range(2 ** len(rolled)):
+        axes = tuple(axis for i, axis in enumerate(rolled) if mask >> i & 1)
+        n = trials.sum(axis=axes, keepdims=True) if axes else trials
+        x = successes.sum(axis=axes, keepdims=True) if axes else successes
+        names = [np.array([ALL], dtype=object) if axis in axes else level
+                 for axis, level in enumerate(levels)]
+        index = np.nonzero(n)
+        table = {key: names[axis][index[axis]] for axis, key in enumerate(keys)}
+        table["observations"] = n[index]
+        table["permitted"] = x[index]
+        tables.append(table)
+    table = {column: np.concatenate([t[column] for t in tables]) for column in tables[0]}
+
+    mean, lower, upper = confint(table["permitted"], table["observations"], conf_level, method)
+    table["estimated.prob"] = mean
+    table["estimated.lower.conf"] = lower
+    table["estimated.upper.conf"] = upper
+    table["key"] = np.array([" + ".join(row) for row in
+                             zip(*[table[key] for key in keys if key != "platform"])],
+                            dtype=object)
+    return table
+
+
+def write_table(table, filepath):
+    """Write a table from estimate_rates as CSV, one row per group"""
+    with open(filepath, 'w') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        writer.writerow(list(table))
+        writer.writerows(zip(*table.values()))
+
+
+if __name__ == "__main__":
+    results = load_results(workers=os.cpu_count())
+
+    # Per ad poster persona, and across all personas (psp.results and
+    # psp.results.allpersonas in analysis-10.2018.R)
+    psp_results = estimate_rates(results, PSP_KEYS, rollups=["persona"])
+    write_table(psp_results, "psp.results.csv")
+    for row in zip(psp_results["platform"], psp_results["key"], psp_results["observations"],
+                   psp_results["estimated.prob"]):
+        print("{}: {} ({} ads, {:.1%} published)".format(*row))
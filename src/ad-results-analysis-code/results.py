@@ -0,0 +1,203 @@
+import csv
+import functools
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+
+
+DATA_DIR = "../../data/ad-results"
+PATTERN = "ad.poster.*.data.csv"
+STORE = DATA_DIR + "/ad-results.npz"
+
+# Canonical column for each header, after lower-casing and collapsing
+# punctuation as R's read.csv does, so that "Left or right leaning?" and
+# "Left or right.leaning?" are the same column. Other columns, such as the
+# rest of the generators' spreadsheet template, are ignored.
+COLUMNS = {"ad.poster.id": "poster.id",
+           "date": "date",
+           "platform": "platform",
+           "ad.id": "ad.id",
+           "folder": "folder",
+           "ad.name": "ad.name",
+           "text": "text",
+           "left.or.right.leaning": "party",
+           "left.or.rightleaning": "party",
+           "product.or.issue.reference": "reference",
+           "state.or.national.candidate.issue": "election",
+           "ad.permitted.y.n": "permitted"}
+
+# Columns stored as integer codes into a sorted list of levels
+CATEGORICAL = ["poster.file", "ad.id", "platform", "party", "reference", "election", "ad.type",
+               "persona", "folder", "ad.name", "text"]
+
+# Ad posters who placed ads from outside the US
+NON_US_POSTERS = {4, 6, 27}
+
+
+def canonical_header(name):
+    return re.sub(r"[^a-z0-9]+", ".", name.lower()).strip(".")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(text):
+    """Days since 1970-01-01 for a date written 9/17/2018 or 09/17/2018"""
+    return (datetime.strptime(text, "%m/%d/%Y") - datetime(1970, 1, 1)).days
+
+
+def read_poster(filepath):
+    """
+    Read one ad poster's CSV into canonical columns, one array per column.
+    See parse_rows.
+    """
+    with open(filepath, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        rows = [row for row in reader if row]
+    return parse_rows(header, rows, filepath)
+
+
+def parse_rows(header, rows, filepath):
+    """
+    Canonical columns for rows of an ad poster's CSV with the given header.
+    Rows whose outcome is recorded as NA are dropped, as in the R analysis,
+    and so are rows whose outcome has not been filled in yet.
+    Derived columns follow analysis-10.2018.R: ad.type is issue.mistake or
+    candidate.mistake, election is state or federal, and persona is US or
+    Non-US.
+    """
+    names = [COLUMNS.get(canonical_header(name)) for name in header]
+    missing = sorted(set(COLUMNS.values()) - set(names))
+    if missing:
+        raise ValueError("Missing columns {} in {}".format(missing, filepath))
+    outcome = names.index("permitted")
+    rows = [row for row in rows if row[outcome] not in ("NA", "")]
+    raw = {name: [row[i] for row in rows] for i, name in enumerate(names) if name is not None}
+
+    poster_id = np.array(raw["poster.id"], dtype=np.int16)
+    election = np.char.lower(np.array(raw["election"], dtype=str))
+    columns = {
+        "poster.file": np.full(len(rows), os.path.basename(filepath)),
+        "poster.id": poster_id,
+        "date": np.array([parse_date(date) for date in raw["date"]], dtype=np.int32),
+        "permitted": np.array(raw["permitted"]) != "N",
+        "election": np.where(election == "national", "federal", election),
+        "ad.type": np.where(np.array(raw["reference"]) == "Issue",
+                            "issue.mistake", "candidate.mistake"),
+        "persona": np.where(np.isin(poster_id, list(NON_US_POSTERS)), "Non-US", "US"),
+    }
+    # Ad IDs are labels rather than numbers: some are like 81a
+    for name in ["ad.id", "platform", "party", "reference", "folder", "ad.name", "text"]:
+        columns[name] = np.array(raw[name], dtype=str)
+    return columns
+
+
+class Results:
+    """
+    Ad placement attempts in columns. Categorical columns hold integer
+    codes into levels[column], numeric columns their values, and date
+    holds days since 1970-01-01.
+    """
+
+
+    def __init__(self, columns, levels, sources=()):
+        self.columns = columns
+        self.levels = levels
+        self.sources = list(sources)
+
+
+    @classmethod
+    def from_posters(cls, posters, sources=()):
+        """
+        Combine the columns of many read_poster results, encoding
+        categoricals. sources names the files they were read from.
+        """
+        columns = {}
+        levels = {}
+        for name in posters[0]:
+            values = np.concatenate([poster[name] for poster in posters])
+            if name in CATEGORICAL:
+                levels[name], codes = np.unique(values, return_inverse=True)
+                columns[name] = codes.astype(np.min_scalar_type(max(len(levels[name]) - 1, 0)))
+            else:
+                columns[name] = values
+        return cls(columns, levels, sources)
+
+
+    def __len__(self):
+        return len(self.columns["permitted"])
+
+
+    def decode(self, name):
+        """A column as values rather than codes"""
+        if name in self.levels:
+            return self.levels[name][self.columns[name]]
+        elif name == "date":
+            return self.columns[name].astype("datetime64[D]")
+        return self.columns[name]
+
+
+    def subset(self, mask):
+        return Results({name: column[mask] for name, column in self.columns.items()},
+                       self.levels, self.sources)
+
+
+    def save(self, filepath):
+        """Write to a compressed .npz file, with permitted packed into bits"""
+        arrays = {name: column for name, column in self.columns.items() if name != "permitted"}
+        arrays.update({name + ".levels": levels for name, levels in self.levels.items()})
+        np.savez_compressed(filepath, permitted=np.packbits(self.columns["permitted"]),
+                            rows=len(self), sources=np.array(self.sources, dtype=str), **arrays)
+
+
+    @classmethod
+    def load(cls, filepath):
+        with np.load(filepath) as data:
+            columns = {}
+            levels = {}
+            for name in data.files:
+                if name.endswith(".levels"):
+                    levels[name[:-len(".levels")]] = data[name]
+                elif name not in ("rows", "sources"):
+                    columns[name] = data[name]
+            columns["permitted"] = np.unpackbits(data["permitted"],
+                                                 count=int(data["rows"])).astype(bool)
+            sources = data["sources"].tolist()
+        return cls(columns, levels, sources)
+
+
+def find_posters(data_dir=DATA_DIR):
+    return sorted(glob.glob(os.path.join(data_dir, PATTERN)))
+
+
+def load_results(filepaths=None, store=STORE, workers=1):
+    """
+    Load every ad poster's results. Files are read in a process pool when
+    workers > 1. If store is given, the combined results are saved there
+    and read back on later calls until any input file changes.
+    """
+    filepaths = find_posters() if filepaths is None else list(filepaths)
+    if store is not None and os.path.exists(store) and \
+            os.path.getmtime(store) >= max(os.path.getmtime(path) for path in filepaths):
+        results = Results.load(store)
+        if results.sources == [os.path.basename(path) for path in filepaths]:
+            return results
+
+    if workers is None or workers <= 1 or len(filepaths) <= 1:
+        posters = [read_poster(path) for path in filepaths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            posters = list(executor.map(read_poster, filepaths))
+    results = Results.from_posters(posters, [os.path.basename(path) for path in filepaths])
+    if store is not None:
+        results.save(store)
+    return results
+
+
+if __name__ == "__main__":
+    results = load_results(workers=os.cpu_count())
+    print("{} ad placement attempts from {} posters, {} to {}".format(
+        len(results), len(results.sources),
+        results.decode("date").min(), results.decode("date").max()))
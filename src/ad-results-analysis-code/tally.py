@@ -0,0 +1,231 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+import numpy as np
+from results import COLUMNS, DATA_DIR, canonical_header, find_posters, parse_rows
+from estimates import PSP_KEYS, tabulate_rates, write_table
+
+
+TALLY = DATA_DIR + "/ad-results-tally.json"
+SUMMARY = "psp.tally.csv"
+
+# The bytes just before a file's ingested offset are checked on every
+# update; if they changed, the file was edited rather than appended to
+CHECK_BYTES = 4096
+
+
+def record_ends(data):
+    """
+    Byte offsets in data at which complete CSV records end, that is line
+    breaks outside quotes, and whether data ends inside a quoted field
+    """
+    ends = []
+    quoted = False
+    position = 0
+    for line in data.splitlines(keepends=True):
+        position += len(line)
+        quoted ^= line.count(b'"') % 2 == 1
+        if not quoted and line.endswith((b"\n", b"\r")):
+            ends.append(position)
+    return ends, quoted
+
+
+def read_records(data):
+    return [row for row in csv.reader(io.StringIO(data.decode("utf-8"), newline="")) if row]
+
+
+def is_complete(row, header):
+    """
+    Whether a row that is not followed by a line break has been written
+    in full. Spreadsheets save the last row without one.
+    """
+    permitted = [COLUMNS.get(canonical_header(name)) for name in header].index("permitted")
+    return len(row) == len(header) and row[permitted] != ""
+
+
+class Tally:
+    """
+    Attempts and permitted attempts per group of PSP_KEYS, kept up to date
+    with ad poster files that grow by appended rows. Each file's byte
+    offset is remembered, so an update reads only the rows written since
+    the last one. A file that shrank, was rewritten at the same size, or
+    whose bytes before the offset changed is counted again from the start.
+    Edits further back than CHECK_BYTES in a file that also grew are not
+    noticed; rebuild with a new Tally after correcting old rows.
+    """
+
+
+    def __init__(self, files=None):
+        self.files = {} if files is None else files
+
+
+    @classmethod
+    def load(cls, filepath=TALLY):
+        """The Tally saved at filepath, or an empty one"""
+        if not os.path.exists(filepath):
+            return cls()
+        with open(filepath) as f:
+            files = json.load(f)
+        for state in files.values():
+            state["counts"] = {tuple(cell[:-2]): cell[-2:] for cell in state["counts"]}
+        return cls(files)
+
+
+    def save(self, filepath=TALLY):
+        files = {name: dict(state, counts=[list(cell) + counts
+                                           for cell, counts in state["counts"].items()])
+                 for name, state in self.files.items()}
+        with open(filepath, 'w') as f:
+            json.dump(files, f)
+
+
+    def is_current(self, filepath):
+        state = self.files.get(os.path.basename(filepath))
+        stat = os.stat(filepath)
+        return state is not None and (state["size"], state["mtime"]) == (stat.st_size,
+                                                                         stat.st_mtime_ns)
+
+
+    def update(self, filepaths=None):
+        """
+        Bring the counts up to date with filepaths, every ad poster's file
+        by default. Returns the names of the files that changed.
+        """
+        filepaths = find_posters() if filepaths is None else list(filepaths)
+        names = [os.path.basename(path) for path in filepaths]
+        changed = [name for name in self.files if name not in names]
+        for name in changed:
+            del self.files[name]
+        for path, name in zip(filepaths, names):
+            if not self.is_current(path):
+                self.ingest(path)
+                changed.append(name)
+        return changed
+
+
+    def ingest(self, filepath):
+        """Count the rows of filepath that have not been counted yet"""
+        name = os.path.basename(filepath)
+        state = self.files.get(name)
+        with open(filepath, 'rb') as f:
+            if state is not None:
+                stat = os.fstat(f.fileno())
+                start = max(state["offset"] - CHECK_BYTES, 0)
+                f.seek(start)
+                checked = f.read(state["offset"] - start)
+                if stat.st_size < state["offset"] or \
+                        (stat.st_size == state["offset"] and stat.st_mtime_ns != state["mtime"]) or \
+                        hashlib.sha1(checked).hexdigest() != state["check"]:
+                    state = None
+            if state is None:
+                f.seek(0)
+                checked = b""
+                state = {"offset": 0, "header": None, "counts": {}}
+            data = f.read()
+            stat = os.fstat(f.fileno())
+
+        ends, quoted = record_ends(data)
+        end = ends[-1] if ends else 0
+        rows = read_records(data[:end])
+        if state["header"] is None and rows:
+            state["header"] = rows.pop(0)
+        tail = [] if quoted else read_records(data[end:])
+        if state["header"] is not None and len(tail) == 1 and is_complete(tail[0],
+                                                                          state["header"]):
+            rows += tail
+            end = len(data)
+
+        if rows:
+            columns = parse_rows(state["header"], rows, filepath)
+            counts = state["counts"]
+            cells = zip(*[columns[key].tolist() for key in PSP_KEYS])
+            for cell, permitted in zip(cells, columns["permitted"].tolist()):
+                trials, successes = counts.get(cell, (0, 0))
+                counts[cell] = [trials + 1, successes + permitted]
+
+        state["offset"] += end
+        state["check"] = hashlib.sha1((checked + data[:end])[-CHECK_BYTES:]).hexdigest()
+        state["size"] = stat.st_size
+        state["mtime"] = stat.st_mtime_ns
+        self.files[name] = state
+
+
+    def count_cells(self):
+        """
+        Attempts and permitted attempts over every file, as two arrays
+        with one axis per key of PSP_KEYS, and the levels of each key
+        """
+        totals = {}
+        for state in self.files.values():
+            for cell, (trials, successes) in state["counts"].items():
+                total = totals.setdefault(cell, [0, 0])
+                total[0] += trials
+                total[1] += successes
+        levels = [sorted({cell[axis] for cell in totals}) for axis in range(len(PSP_KEYS))]
+        shape = tuple(len(level) for level in levels)
+        trials = np.zeros(shape, dtype=np.int64)
+        successes = np.zeros(shape, dtype=np.int64)
+        for cell, (n, x) in totals.items():
+            index = tuple(level.index(value) for level, value in zip(levels, cell))
+            trials[index] = n
+            successes[index] = x
+        return trials, successes, levels
+
+
+    def estimate_rates(self, rollups=("persona",), conf_level=0.95, method="wilson"):
+        """The table estimates.estimate_rates gives for PSP_KEYS"""
+        trials, successes, levels = self.count_cells()
+        return tabulate_rates(trials, successes, levels, PSP_KEYS, rollups, conf_level, method)
+
+
+def report(tally, filepath=SUMMARY):
+    table = tally.estimate_rates()
+    write_table(table, filepath)
+    print("{} ad placement attempts, {} published".format(
+        sum(table["observations"][table["persona"] == "All"]),
+        sum(table["permitted"][table["persona"] == "All"])))
+    for row in zip(table["platform"], table["key"], table["observations"],
+                   table["estimated.prob"]):
+        print("{}: {} ({} ads, {:.1%} published)".format(*row))
+
+
+def watch(tally, interval=10, store=TALLY, filepath=SUMMARY):
+    """
+    Check the ad poster files every interval seconds, and save the tally
+    and rewrite the summary whenever any of them changed
+    """
+    while True:
+        changed = tally.update()
+        if changed:
+            tally.save(store)
+            print("{}: updated from {}".format(time.strftime("%H:%M:%S"), ", ".join(changed)))
+            report(tally, filepath)
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tally ad poster results as rows are added")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep checking for new rows and refresh the summary")
+    parser.add_argument("--interval", type=float, default=10,
+                        help="Seconds between checks in watch mode")
+    parser.add_argument("--summary", default=SUMMARY)
+    parser.add_argument("--store", default=TALLY)
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Count every file again from the start")
+    args = parser.parse_args()
+
+    tally = Tally() if args.rebuild else Tally.load(args.store)
+    if args.watch:
+        try:
+            watch(tally, args.interval, args.store, args.summary)
+        except KeyboardInterrupt:
+            pass
+    else:
+        tally.update()
+        tally.save(args.store)
+        report(tally, args.summary)
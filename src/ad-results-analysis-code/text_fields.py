@@ -0,0 +1,101 @@
+import functools
+import os
+import re
+import numpy as np
+from results import Results, load_results
+from estimates import estimate_rates
+
+
+# The Text column packs the fields of each ad, as written by the ad
+# generators: "Text: ..., Website URL: ..., Headline: ..., State: ...,
+# District: ..., Office: ..., Keywords: ...". Park and veteran ads have
+# no District or Office, and end with a stray quote.
+TEXT_FIELDS = re.compile(r"Text: (?P<text>.*?), Website URL: (?P<url>.*?), "
+                         r"Headline: (?P<headline>.*?), State: (?P<state>.*?)"
+                         r"(?:, District: (?P<district>.*?), Office: (?P<office>.*?))?"
+                         r", Keywords: (?P<keywords>.*?)'?", re.DOTALL)
+PRODUCT_ID = re.compile(r"/click/-/(\d+)/pdp")
+
+# Columns added by add_text_fields, as categoricals, and the product ID
+# in the Best Buy link, or -1
+FIELDS = ["state", "district", "office", "url", "keywords"]
+
+# Gubernatorial ads name the state, the others use its code
+STATE_CODES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", "California": "CA",
+    "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE", "District of Columbia": "DC",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
+    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY", "Louisiana": "LA",
+    "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA", "Michigan": "MI",
+    "Minnesota": "MN", "Mississippi": "MS", "Missouri": "MO", "Montana": "MT",
+    "Nebraska": "NE", "Nevada": "NV", "New Hampshire": "NH", "New Jersey": "NJ",
+    "New Mexico": "NM", "New York": "NY", "North Carolina": "NC", "North Dakota": "ND",
+    "Ohio": "OH", "Oklahoma": "OK", "Oregon": "OR", "Pennsylvania": "PA",
+    "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD", "Tennessee": "TN",
+    "Texas": "TX", "Utah": "UT", "Vermont": "VT", "Virginia": "VA", "Washington": "WA",
+    "West Virginia": "WV", "Wisconsin": "WI", "Wyoming": "WY"}
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_text(text):
+    """
+    The fields of one packed Text value as a dict, with quotes undoubled,
+    states as codes, and "" for a District or Office the ad does not have.
+    The dict is cached and shared, so do not modify it.
+    """
+    match = TEXT_FIELDS.fullmatch(text)
+    if match is None:
+        raise ValueError("Unrecognized ad text {!r}".format(text))
+    fields = {name: (value or "").replace("''", "'")
+              for name, value in match.groupdict().items()}
+    fields["state"] = STATE_CODES.get(fields["state"], fields["state"])
+    if fields["district"] == "n/a":
+        fields["district"] = ""
+    product = PRODUCT_ID.search(fields["url"])
+    fields["product.id"] = int(product.group(1)) if product else -1
+    return fields
+
+
+def add_text_fields(results):
+    """
+    results with the fields of its Text column as columns of their own.
+    Each distinct text is parsed once, and the fields of every row are
+    gathered from those by its text code.
+    """
+    parsed = [parse_text(text) for text in results.levels["text"].tolist()]
+    codes = results.columns["text"]
+    columns = dict(results.columns)
+    levels = dict(results.levels)
+    for name in FIELDS:
+        levels[name], field_codes = np.unique(np.array([fields[name] for fields in parsed],
+                                                       dtype=str), return_inverse=True)
+        field_codes = field_codes.astype(np.min_scalar_type(max(len(levels[name]) - 1, 0)))
+        columns[name] = field_codes[codes]
+    columns["product.id"] = np.array([fields["product.id"] for fields in parsed],
+                                     dtype=np.int64)[codes]
+    return Results(columns, levels, results.sources)
+
+
+def has_keywords(results):
+    """
+    Every keyword used in results, and a boolean array with a row per
+    attempt and a column per keyword, for ads that list several
+    """
+    keyword_lists = [keywords.split(", ") for keywords in results.levels["keywords"].tolist()]
+    keywords = sorted({keyword for keyword_list in keyword_lists for keyword in keyword_list})
+    table = np.array([[keyword in keyword_list for keyword in keywords]
+                      for keyword_list in keyword_lists], dtype=bool).reshape(-1, len(keywords))
+    return keywords, table[results.columns["keywords"]]
+
+
+if __name__ == "__main__":
+    results = add_text_fields(load_results(workers=os.cpu_count()))
+    for keys in (["platform", "office"], ["platform", "state"]):
+        table = estimate_rates(results, keys)
+        for row in zip(*[table[key] for key in keys], table["observations"],
+                       table["estimated.prob"]):
+            print("{}: {} ({} ads, {:.1%} published)".format(row[0], row[1] or "n/a", *row[2:]))
+    keywords, matches = has_keywords(results)
+    for keyword, match in zip(keywords, matches.T):
+        print("{}: {} ads, {:.1%} published".format(
+            keyword, match.sum(), results.columns["permitted"][match].mean()))
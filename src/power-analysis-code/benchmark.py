@@ -0,0 +1,133 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from simulation import Characteristic, Persona, Simulation
+
+
+HISTORY = "benchmark-history.jsonl"
+BASELINE = "benchmark-baseline.json"
+
+MODES = {
+    "csv": lambda simulation, path: simulation.write_simulation(path + ".csv"),
+    "stream-gzip": lambda simulation, path: simulation.write_simulation(path + ".csv.gz",
+                                                                        compression='gzip'),
+    "counts": lambda simulation, path: simulation.write_counts(path + "-counts.csv"),
+    "columnar": lambda simulation, path: simulation.write_columnar(path + ".npz"),
+    "ground-truth": lambda simulation, path: simulation.write_ground_truth(path + "-truth.csv"),
+    "get-permitted": lambda simulation, path: [simulation.get_permitted(Persona(*cell))
+                                               for cell in simulation.get_cells()],
+}
+
+
+def make_simulation(levels, observations):
+    """A four-factor simulation with the given number of levels per factor"""
+    rng = np.random.default_rng(levels)
+    factors = [[Characteristic("{}.{}".format(factor, level), rate)
+                for level, rate in enumerate(rng.uniform(0.5, 1, levels))]
+               for factor in ["persona", "election", "party", "ad_type"]]
+    return Simulation(observations, *factors, title="Benchmark", seed=levels)
+
+
+def run_mode(mode, simulation, directory):
+    with contextlib.redirect_stdout(io.StringIO()):
+        MODES[mode](simulation, os.path.join(directory, mode))
+
+
+def run_case(mode, levels, observations, directory, repeats=5):
+    """
+    Time one mode on one grid, returning a result record. seconds is the
+    fastest of repeats runs, each on a fresh simulation; peak memory is
+    traced in a run of its own so tracing does not slow the timed runs.
+    """
+    times = []
+    for _ in range(repeats):
+        simulation = make_simulation(levels, observations)
+        started = time.perf_counter()
+        run_mode(mode, simulation, directory)
+        times.append(time.perf_counter() - started)
+    simulation = make_simulation(levels, observations)
+    rows = len(simulation.get_rates()) * observations
+    tracemalloc.start()
+    run_mode(mode, simulation, directory)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seconds = min(times)
+    return {"case": "{}/levels={}/observations={}".format(mode, levels, observations),
+            "mode": mode, "levels": levels, "observations": observations, "rows": rows,
+            "repeats": repeats, "seconds": seconds, "median.seconds": float(np.median(times)),
+            "rows.per.sec": rows / seconds, "peak.memory.mb": peak / 2**20}
+
+
+def run_suite(modes, levels, observations, repeats=5):
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, level, n in itertools.product(modes, levels, observations):
+            result = run_case(mode, level, n, directory, repeats)
+            print("{}: {:.3f}s, {:.0f} rows/sec, {:.1f} MB peak".format(
+                result["case"], result["seconds"], result["rows.per.sec"],
+                result["peak.memory.mb"]))
+            yield result
+
+
+# Differences below these are noise however large they are relative to
+# the baseline
+NOISE_FLOOR = {"seconds": 0.01, "peak.memory.mb": 1.0}
+
+
+def find_regressions(results, baseline, tolerance, noise_floor=NOISE_FLOOR):
+    """
+    Cases that are more than tolerance slower or larger than the baseline,
+    and by more than the noise floor
+    """
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["case"])
+        if previous is None:
+            continue
+        for measure, floor in noise_floor.items():
+            if result[measure] > previous[measure] * (1 + tolerance) and \
+                    result[measure] - previous[measure] > floor:
+                regressions.append("{}: {} {:.3f} vs baseline {:.3f}".format(
+                    result["case"], measure, result[measure], previous[measure]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark simulation generation")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--levels", nargs="+", type=int, default=[2, 3, 5])
+    parser.add_argument("--observations", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Timed runs per case, of which the fastest is kept")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown over the baseline before flagging, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    results = list(run_suite(args.modes, args.levels, args.observations, args.repeats))
+
+    # Append this run to the history file
+    run = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+           "numpy": np.__version__, "machine": platform.machine(), "results": results}
+    with open(HISTORY, 'a') as history:
+        history.write(json.dumps(run) + "\n")
+
+    if args.update_baseline or not os.path.exists(BASELINE):
+        with open(BASELINE, 'w') as f:
+            json.dump({result["case"]: result for result in results}, f, indent=2)
+        print("Stored baseline in", BASELINE)
+    else:
+        with open(BASELINE) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            exit(1)
@@ -0,0 +1,90 @@
+import numpy as np
+from math import erfc, sqrt
+
+
+class LogisticFit:
+    """
+    Coefficients, standard errors, z values and p-values of a batch of
+    logistic regressions, in the same layout as summary(glm(...))$coefficients.
+    Every array has a leading batch axis when a batch was fitted.
+    """
+
+    def __init__(self, coefficients, std_errors, deviance, iterations, converged):
+        self.coefficients = coefficients
+        self.std_errors = std_errors
+        self.z_values = coefficients / std_errors
+        self.p_values = np.vectorize(lambda z: erfc(abs(z) / sqrt(2)))(self.z_values)
+        self.deviance = deviance
+        self.iterations = iterations
+        self.converged = converged
+
+
+def binomial_deviance(y, mu, weights):
+    """Residual deviance of a binomial model, as reported by glm"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(y > 0, y * np.log(y / mu), 0) + \
+            np.where(y < 1, (1 - y) * np.log((1 - y) / (1 - mu)), 0)
+    return 2 * (weights * terms).sum(axis=-1)
+
+
+def fit_logistic(X, y, weights=None, max_iter=25, epsilon=1e-8):
+    """
+    Fit glm(y ~ X, family=binomial) by iteratively reweighted least
+    squares, for many datasets at once. X is (rows, coefficients) when
+    every dataset shares a design, or (datasets, rows, coefficients);
+    y is (datasets, rows) or (rows,). Rows with weight 0 are ignored,
+    which lets datasets of different sizes be padded into one batch.
+    Starting values and the convergence rule follow glm.fit's defaults.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    weights = np.ones(y.shape) if weights is None else np.asarray(weights, dtype=float)
+
+    mu = (weights * y + 0.5) / (weights + 1)
+    eta = np.log(mu / (1 - mu))
+    deviance = binomial_deviance(y, mu, weights)
+    converged = np.zeros(y.shape[:-1], dtype=bool)
+    for iteration in range(1, max_iter + 1):
+        w = weights * mu * (1 - mu)
+        z = eta + (y - mu) / (mu * (1 - mu))
+        XtWX = np.einsum('...ri,...r,...rj->...ij', X, w, X)
+        XtWz = np.einsum('...ri,...r->...i', X, w * z)
+        beta = np.einsum('...ij,...j->...i', np.linalg.pinv(XtWX, hermitian=True), XtWz)
+        eta = np.einsum('...ri,...i->...r', X, beta)
+        mu = np.clip(1 / (1 + np.exp(-eta)), 1e-15, 1 - 1e-15)
+        previous, deviance = deviance, binomial_deviance(y, mu, weights)
+        converged = np.abs(deviance - previous) / (np.abs(deviance) + 0.1) < epsilon
+        if converged.all():
+            break
+
+    # Like summary.glm, standard errors use the weights of the last iteration
+    variance = np.diagonal(np.linalg.pinv(XtWX, hermitian=True), axis1=-2, axis2=-1)
+    with np.errstate(invalid='ignore'):
+        std_errors = np.where(variance > 0, np.sqrt(np.abs(variance)), np.nan)
+    return LogisticFit(beta, std_errors, deviance, iteration, converged)
+
+
+def treatment_columns(values, levels):
+    """
+    Indicator columns for every level but the first, like R's default
+    treatment contrasts for a factor with the given levels
+    """
+    values = np.asarray(values)
+    return np.stack([values == level for level in levels[1:]], axis=-1).astype(float)
+
+
+def regression_power(simulation, factor, sample_size, replicates, alpha=0.05):
+    """
+    Share of replicates in which glm(permitted ~ factor) finds each
+    non-reference level of factor significant at alpha, when sample_size
+    attempts are placed in every combination of the simulation, as in
+    the stratified sample at the end of plot-simulation.R
+    """
+    column = simulation.design.names.index(factor)
+    codes = np.repeat(simulation.design.codes[:, column], sample_size)
+    levels = range(len(simulation.get_factors()[column]))
+    X = np.column_stack([np.ones(len(codes)), treatment_columns(codes, levels)])
+    rates = np.repeat(simulation.get_rates(), sample_size)
+    y = simulation.get_rng(3, sample_size).binomial(1, rates, size=(replicates, len(rates)))
+    fit = fit_logistic(X, y)
+    return (fit.p_values[:, 1:] < alpha).mean(axis=0)
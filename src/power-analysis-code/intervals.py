@@ -0,0 +1,279 @@
+import math
+import numpy as np
+from statistics import NormalDist
+
+
+METHODS = ["wilson", "agresti-coull", "jeffreys", "exact"]
+
+# Intervals for every x <= n <= MAX_TRIALS are computed once per method
+# and confidence level, and looked up from then on
+MAX_TRIALS = 1000
+
+
+def wilson(successes, trials, conf_level=0.95):
+    """
+    Wilson score intervals for arrays of successes and trials, matching
+    binom.confint(..., methods="wilson") in R. Returns (mean, lower, upper),
+    where mean is the raw proportion as reported by binom.confint.
+    """
+    x = np.asarray(successes, dtype=float)
+    n = np.asarray(trials, dtype=float)
+    z = NormalDist().inv_cdf(1 - (1 - conf_level) / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = x / n
+        center = (x + z * z / 2) / (n + z * z)
+        spread = z * np.sqrt(n) / (n + z * z) * np.sqrt(mean * (1 - mean) + z * z / (4 * n))
+    # The bounds are exactly 0 and 1 at the extremes, which rounding can miss
+    lower = np.where(x == 0, 0.0, center - spread)
+    upper = np.where(x == n, 1.0, center + spread)
+    return mean, lower, upper
+
+
+def agresti_coull(successes, trials, conf_level=0.95):
+    """
+    Agresti-Coull intervals, matching binom.confint(...,
+    methods="agresti-coull"), which does not clip the bounds to [0, 1]
+    """
+    x = np.asarray(successes, dtype=float)
+    n = np.asarray(trials, dtype=float)
+    z = NormalDist().inv_cdf(1 - (1 - conf_level) / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = x / n
+        n_tilde = n + z * z
+        p_tilde = (x + z * z / 2) / n_tilde
+        spread = z * np.sqrt(p_tilde * (1 - p_tilde) / n_tilde)
+    # With no trials the interval is [0, 1], up to rounding
+    return mean, np.where(n == 0, 0.0, p_tilde - spread), np.where(n == 0, 1.0, p_tilde + spread)
+
+
+def jeffreys(successes, trials, conf_level=0.95):
+    """
+    Equal-tailed Jeffreys intervals, the quantiles of Beta(x + 1/2,
+    n - x + 1/2), with the lower bound 0 when x = 0 and the upper bound 1
+    when x = n (Brown, Cai & DasGupta, 2001). With no trials the interval
+    is [0, 1], as for every method.
+    """
+    x = np.asarray(successes, dtype=float)
+    n = np.asarray(trials, dtype=float)
+    alpha = (1 - conf_level) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = x / n
+    valid = n > 0
+    a = np.where(valid, x + 0.5, 1.0)
+    b = np.where(valid, n - x + 0.5, 1.0)
+    lower = np.where(x == 0, 0.0, beta_quantile(alpha, a, b))
+    upper = np.where(x == n, 1.0, beta_quantile(1 - alpha, a, b))
+    return mean, lower, upper
+
+
+def exact(successes, trials, conf_level=0.95):
+    """Clopper-Pearson intervals, matching binom.confint(..., methods="exact")"""
+    x = np.asarray(successes, dtype=float)
+    n = np.asarray(trials, dtype=float)
+    alpha = (1 - conf_level) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = x / n
+    valid = n > 0
+    lower = beta_quantile(alpha, np.where(x > 0, x, 1.0), np.where(valid, n - x + 1, 1.0))
+    upper = beta_quantile(1 - alpha, np.where(valid, x + 1, 1.0), np.where(x < n, n - x, 1.0))
+    lower = np.where(x == 0, 0.0, lower)
+    upper = np.where(x == n, 1.0, upper)
+    return mean, lower, upper
+
+
+INTERVALS = {"wilson": wilson, "agresti-coull": agresti_coull,
+             "jeffreys": jeffreys, "exact": exact}
+
+
+def log_beta(a, b):
+    lgamma = np.vectorize(math.lgamma, otypes=[float])
+    return lgamma(a) + lgamma(b) - lgamma(a + b)
+
+
+def beta_fraction(a, b, x, max_iter=1000, epsilon=1e-15):
+    """
+    Continued fraction for the regularized incomplete beta function, by
+    the modified Lentz method (Numerical Recipes, section 6.4). Elements
+    drop out of the iteration as they converge.
+    """
+    tiny = 1e-300
+    h = np.empty_like(x)
+    active = np.arange(len(x))
+    a, b, x = a.copy(), b.copy(), x.copy()
+    c = np.ones_like(x)
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+    f = d
+    for m in range(1, max_iter + 1):
+        for aa in (m * (b - m) * x / ((a - 1 + 2 * m) * (a + 2 * m)),
+                   -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 1 + 2 * m))):
+            d = 1 + aa * d
+            d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1 + aa / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            f = f * d * c
+        converged = np.abs(d * c - 1) < epsilon
+        h[active[converged]] = f[converged]
+        keep = ~converged
+        if not keep.any():
+            break
+        active, a, b, x, c, d, f = (v[keep] for v in (active, a, b, x, c, d, f))
+    h[active] = f
+    return h
+
+
+def beta_cdf(x, a, b, lbeta=None):
+    """The regularized incomplete beta function I_x(a, b), elementwise"""
+    x, a, b = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(a, dtype=float),
+                                  np.asarray(b, dtype=float))
+    lbeta = log_beta(a, b) if lbeta is None else np.broadcast_to(lbeta, x.shape)
+    shape = x.shape
+    x, a, b, lbeta = (np.ravel(v) for v in (x, a, b, lbeta))
+    inside = (x > 0) & (x < 1)
+    xs = np.where(inside, x, 0.5)
+    front = np.exp(a * np.log(xs) + b * np.log1p(-xs) - lbeta)
+    # The fraction converges quickly below the mean; use symmetry above it
+    swap = xs > (a + 1) / (a + b + 2)
+    fraction = beta_fraction(np.where(swap, b, a), np.where(swap, a, b), np.where(swap, 1 - xs, xs))
+    cdf = np.where(swap, 1 - front * fraction / b, front * fraction / a)
+    return np.where(inside, cdf, np.where(x <= 0, 0.0, 1.0)).reshape(shape)
+
+
+def beta_guess(p, a, b):
+    """Starting point for beta_quantile (Numerical Recipes, section 6.14)"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # Normal approximation, for a and b of at least 1
+        pp = np.where(p < 0.5, p, 1 - p)
+        t = np.sqrt(-2 * np.log(pp))
+        z = (2.30753 + t * 0.27061) / (1 + t * (0.99229 + t * 0.04481)) - t
+        z = np.where(p < 0.5, -z, z)
+        al = (z * z - 3) / 6
+        h = 2 / (1 / (2 * a - 1) + 1 / (2 * b - 1))
+        w = z * np.sqrt(al + h) / h - (1 / (2 * b - 1) - 1 / (2 * a - 1)) * (al + 5 / 6 - 2 / (3 * h))
+        normal = a / (a + b * np.exp(2 * w))
+        # Power-law tails otherwise
+        lower = np.exp(a * np.log(a / (a + b))) / a
+        upper = np.exp(b * np.log(b / (a + b))) / b
+        total = lower + upper
+        tails = np.where(p < lower / total, (a * total * p) ** (1 / a),
+                         1 - (b * total * (1 - p)) ** (1 / b))
+    guess = np.where((a >= 1) & (b >= 1), normal, tails)
+    return np.where(np.isfinite(guess), np.clip(guess, 1e-300, 1 - 1e-16), a / (a + b))
+
+
+def beta_quantile(p, a, b, max_iter=100, tolerance=1e-14):
+    """
+    The p quantile of Beta(a, b), like qbeta in R, by Newton's method
+    kept inside a bisection bracket so every element converges.
+    Elements drop out of the iteration as they converge.
+    """
+    p, a, b = np.broadcast_arrays(np.asarray(p, dtype=float), np.asarray(a, dtype=float),
+                                  np.asarray(b, dtype=float))
+    shape = p.shape
+    p, a, b = (np.ravel(v) for v in (p, a, b))
+    lbeta = log_beta(a, b)
+    result = beta_guess(p, a, b)
+    active = np.arange(len(p))
+    q = result.copy()
+    low = np.zeros(len(p))
+    high = np.ones(len(p))
+    for _ in range(max_iter):
+        error = beta_cdf(q, a, b, lbeta) - p
+        low = np.where(error < 0, q, low)
+        high = np.where(error > 0, q, high)
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            density = np.exp((a - 1) * np.log(q) + (b - 1) * np.log1p(-q) - lbeta)
+            step = q - error / density
+        step = np.where(np.isfinite(step) & (step >= low) & (step <= high), step, (low + high) / 2)
+        converged = (np.abs(step - q) <= tolerance * q) | (error == 0)
+        result[active] = step
+        keep = ~converged
+        if not keep.any():
+            break
+        active, p, a, b, lbeta, q, low, high = (v[keep] for v in
+                                                 (active, p, a, b, lbeta, step, low, high))
+    return result.reshape(shape)
+
+
+class IntervalTable:
+    """
+    Intervals of one method and confidence level for every x <= n up to
+    the largest n looked up so far, at most max_trials, stored in
+    triangular arrays, so that looking up arrays of (successes, trials)
+    is a gather rather than a computation. The table grows when a lookup
+    needs larger n, if that costs no more intervals than the lookup
+    itself. Smaller lookups, and trials above max_trials, are computed
+    directly for their distinct (successes, trials) pairs.
+    """
+
+    def __init__(self, method="wilson", conf_level=0.95, max_trials=MAX_TRIALS):
+        self.method = method
+        self.conf_level = conf_level
+        self.max_trials = max_trials
+        self.lower = np.empty(0)
+        self.upper = np.empty(0)
+        self.trials = -1
+
+
+    def extend(self, trials):
+        """Add the intervals for every n up to trials, at most max_trials"""
+        trials = min(trials, self.max_trials)
+        if trials <= self.trials:
+            return
+        n = np.repeat(np.arange(self.trials + 1, trials + 1),
+                      np.arange(self.trials + 2, trials + 2))
+        x = np.arange(len(self.lower), len(self.lower) + len(n)) - n * (n + 1) // 2
+        mean, lower, upper = INTERVALS[self.method](x, n, self.conf_level)
+        self.lower = np.concatenate([self.lower, lower])
+        self.upper = np.concatenate([self.upper, upper])
+        self.trials = trials
+
+
+    def compute(self, x, n):
+        """(lower, upper) for arrays of x and n, each distinct pair computed once"""
+        pairs, index = np.unique(np.stack([x, n]), axis=1, return_inverse=True)
+        mean, lower, upper = INTERVALS[self.method](pairs[0], pairs[1], self.conf_level)
+        return lower[index.reshape(x.shape)], upper[index.reshape(x.shape)]
+
+
+    def lookup(self, successes, trials):
+        """(mean, lower, upper) for integer arrays of successes and trials"""
+        x, n = np.broadcast_arrays(np.asarray(successes, dtype=np.int64),
+                                   np.asarray(trials, dtype=np.int64))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = x / n
+        inside = n <= self.max_trials
+        needed = int(n[inside].max(initial=-1))
+        if needed > self.trials and (needed + 1) * (needed + 2) // 2 - len(self.lower) <= x.size:
+            self.extend(needed)
+        inside &= n <= self.trials
+        index = np.where(inside, n * (n + 1) // 2 + x, 0)
+        lower = self.lower[index] if len(self.lower) else np.zeros(x.shape)
+        upper = self.upper[index] if len(self.upper) else np.zeros(x.shape)
+        if not np.all(inside):
+            lower[~inside], upper[~inside] = self.compute(x[~inside], n[~inside])
+        return mean, lower, upper
+
+
+TABLES = {}
+
+
+def get_table(method="wilson", conf_level=0.95, max_trials=MAX_TRIALS):
+    """
+    The IntervalTable for a method and confidence level, created on
+    first use. Call get_table(...).extend(trials) before forking worker
+    processes so that they share the table rather than each building it.
+    """
+    key = (method, conf_level, max_trials)
+    if key not in TABLES:
+        TABLES[key] = IntervalTable(method, conf_level, max_trials)
+    return TABLES[key]
+
+
+def confint(successes, trials, conf_level=0.95, method="wilson", max_trials=MAX_TRIALS):
+    """
+    Binomial confidence intervals by any of METHODS for arrays of integer
+    successes and trials, read from a table. Returns (mean, lower, upper),
+    as binom.confint does.
+    """
+    return get_table(method, conf_level, max_trials).lookup(successes, trials)
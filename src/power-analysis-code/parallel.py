@@ -0,0 +1,38 @@
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+
+def map_shards(function, shards, workers=1):
+    """
+    Apply function to every shard, in a process pool when workers > 1,
+    and return the results in shard order. Shards must be defined
+    independently of the worker count, so that every shard draws from
+    its own random stream and the merged result is the same for any
+    number of workers.
+    """
+    shards = list(shards)
+    if workers is None or workers <= 1 or len(shards) <= 1:
+        return [function(shard) for shard in shards]
+    chunksize = max(1, len(shards) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, shards, chunksize=chunksize))
+
+
+def imap_shards(function, shards, workers=1):
+    """
+    Like map_shards, but yield results one at a time in shard order,
+    keeping at most two shards per worker in flight so memory stays
+    bounded however many shards there are
+    """
+    if workers is None or workers <= 1:
+        for shard in shards:
+            yield function(shard)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for shard in shards:
+            pending.append(executor.submit(function, shard))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
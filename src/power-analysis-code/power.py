@@ -0,0 +1,86 @@
+import csv
+from intervals import confint, get_table
+from parallel import map_shards
+
+
+class PowerAnalysis:
+    """
+    Monte Carlo power analysis over every combination in a Simulation.
+    Each replicate draws sample_size attempts per combination from its
+    true permit rate and estimates that rate with a confidence interval
+    by method, one of intervals.METHODS.
+    """
+
+    HEADER = ["persona", "election", "party", "ad_type", "sample.size",
+              "replicates", "groundtruth", "coverage", "mean.width", "power"]
+
+    def __init__(self, simulation, sample_sizes, replicates, null_rate=1.0,
+                 conf_level=0.95, batch_size=1000, workers=1, method="wilson"):
+        self.simulation = simulation
+        self.sample_sizes = sample_sizes
+        self.replicates = replicates
+        self.null_rate = null_rate
+        self.conf_level = conf_level
+        self.batch_size = batch_size
+        self.workers = workers
+        self.method = method
+
+
+    def get_batches(self, sample_size):
+        """
+        Split the replicates into (sample_size, index, replicates) batches
+        of at most batch_size, each of which draws from its own stream
+        """
+        full, rest = divmod(self.replicates, self.batch_size)
+        sizes = [self.batch_size] * full + ([rest] if rest else [])
+        return [(sample_size, i, size) for i, size in enumerate(sizes)]
+
+
+    def run_batch(self, batch):
+        """
+        Draw one batch of replicates and return per-combination counts of
+        covering CIs, summed CI widths and detections
+        """
+        sample_size, index, replicates = batch
+        rates = self.simulation.get_rates()
+        rng = self.simulation.get_rng(2, sample_size, index)
+        permitted = rng.binomial(sample_size, rates, size=(replicates, len(rates)))
+        mean, lower, upper = confint(permitted, sample_size, self.conf_level, self.method)
+        covered = ((lower <= rates) & (rates <= upper)).sum(axis=0)
+        width = (upper - lower).sum(axis=0)
+        detected = ((self.null_rate < lower) | (upper < self.null_rate)).sum(axis=0)
+        return covered, width, detected
+
+
+    def get_power(self, sample_size):
+        """
+        Run every replicate for one sample size. Returns per-combination
+        arrays of CI coverage of the true rate, mean CI width, and power,
+        the share of replicates whose CI excludes null_rate.
+        """
+        # Fill the interval table once, before the workers are forked
+        get_table(self.method, self.conf_level).extend(sample_size)
+        totals = map_shards(self.run_batch, self.get_batches(sample_size), self.workers)
+        covered, width, detected = [sum(column) for column in zip(*totals)]
+        return covered / self.replicates, width / self.replicates, detected / self.replicates
+
+
+    def run(self):
+        """One result row per sample size and combination"""
+        rates = self.simulation.get_rates()
+        cells = self.simulation.get_cells()
+        results = []
+        for sample_size in self.sample_sizes:
+            coverage, width, power = self.get_power(sample_size)
+            for i, cell in enumerate(cells):
+                results.append([c.name for c in cell] +
+                               [sample_size, self.replicates, rates[i],
+                                coverage[i], width[i], power[i]])
+        return results
+
+
+    def write_power(self, filepath):
+        with open(filepath, 'w') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(self.simulation.design.names + self.HEADER[4:])
+            writer.writerows(self.run())
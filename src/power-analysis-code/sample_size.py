@@ -0,0 +1,132 @@
+import csv
+import numpy as np
+from statistics import NormalDist
+from intervals import wilson
+from power import PowerAnalysis
+
+
+def wilson_half_width(rate, n, conf_level=0.95):
+    """Half-width of the Wilson interval when a rate is observed exactly"""
+    mean, lower, upper = wilson(np.asarray(rate) * n, n, conf_level)
+    return (upper - lower) / 2
+
+
+def detection_power(rate, null_rate, n, conf_level=0.95):
+    """
+    Normal approximation to the chance that a confidence interval for
+    rate, from n attempts, excludes null_rate
+    """
+    z = NormalDist().inv_cdf(1 - (1 - conf_level) / 2)
+    rate = np.asarray(rate, dtype=float)
+    sd = np.sqrt(np.maximum(rate * (1 - rate), 1e-12) / n)
+    distance = np.abs(np.asarray(null_rate) - rate) / sd
+    cdf = np.vectorize(NormalDist().cdf)
+    return cdf(distance - z) + cdf(-distance - z)
+
+
+class SampleSizeSolver:
+    """
+    Smallest number of placements per combination of a Simulation that
+    meets a target, either a maximum Wilson CI half-width or a minimum
+    power to detect a difference in permit rate. Each search starts from
+    an analytic approximation and is confirmed with Monte Carlo runs,
+    which are cached by sample size across combinations and searches.
+    Sample sizes that cannot meet the target within max_n are None.
+    """
+
+    HEADER = ["sample.size", "groundtruth", "analytic.sample.size", "achieved"]
+
+    def __init__(self, simulation, conf_level=0.95, replicates=2000, max_n=5000, workers=1):
+        self.simulation = simulation
+        self.conf_level = conf_level
+        self.replicates = replicates
+        self.max_n = max_n
+        self.workers = workers
+        self.cache = {}
+
+
+    def smallest_n(self, meets_target, low=1, high=None):
+        """Binary search for the smallest n in [low, high] where meets_target(n) holds"""
+        high = high or self.max_n
+        if not meets_target(high):
+            return None
+        while low < high:
+            middle = (low + high) // 2
+            if meets_target(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+
+    def monte_carlo(self, n, null_rates):
+        """Coverage, mean CI width and power of every combination at n"""
+        key = (n, tuple(null_rates))
+        if key not in self.cache:
+            power = PowerAnalysis(self.simulation, [n], self.replicates,
+                                  null_rate=np.asarray(null_rates),
+                                  conf_level=self.conf_level, workers=self.workers)
+            self.cache[key] = power.get_power(n)
+        return self.cache[key]
+
+
+    def confirm(self, analytic, null_rates, measure, target):
+        """
+        Search around each combination's analytic sample size for the
+        smallest n whose Monte Carlo result meets the target. Returns
+        (sample sizes, achieved results).
+        """
+        sizes = []
+        achieved = []
+        for i, n in enumerate(analytic):
+            meets_target = lambda n: target(measure(self.monte_carlo(n, null_rates))[i])
+            if n is None:
+                pass
+            elif meets_target(n):
+                n = self.smallest_n(meets_target, high=n)
+            else:
+                # Grow geometrically until the target is met, then bisect
+                low = n + 1
+                while n < self.max_n and not meets_target(n):
+                    low = n + 1
+                    n = min(self.max_n, n * 2)
+                n = self.smallest_n(meets_target, low=low, high=n)
+            sizes.append(n)
+            achieved.append(None if n is None else measure(self.monte_carlo(n, null_rates))[i])
+        return sizes, achieved
+
+
+    def solve_half_width(self, half_width):
+        """Smallest n per combination with mean Wilson half-width <= half_width"""
+        rates = self.simulation.get_rates()
+        analytic = [self.smallest_n(lambda n: wilson_half_width(rate, n, self.conf_level)
+                                    <= half_width) for rate in rates]
+        sizes, achieved = self.confirm(analytic, np.zeros(len(rates)),
+                                       lambda result: result[1] / 2,
+                                       lambda result: result <= half_width)
+        return list(zip(sizes, rates, analytic, achieved))
+
+
+    def solve_power(self, difference, power):
+        """
+        Smallest n per combination whose CI excludes a permit rate
+        difference away from the true rate with probability >= power
+        """
+        rates = self.simulation.get_rates()
+        null_rates = np.clip(rates + difference, 0, 1)
+        analytic = [self.smallest_n(lambda n: detection_power(rate, null_rate, n,
+                                                              self.conf_level) >= power)
+                    for rate, null_rate in zip(rates, null_rates)]
+        sizes, achieved = self.confirm(analytic, null_rates,
+                                       lambda result: result[2],
+                                       lambda result: result >= power)
+        return list(zip(sizes, rates, analytic, achieved))
+
+
+    def write_sample_sizes(self, filepath, results):
+        """Write the results of a solve_* call, one row per combination"""
+        with open(filepath, 'w') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(self.simulation.design.names + self.HEADER)
+            for cell, result in zip(self.simulation.get_cells(), results):
+                writer.writerow([c.name for c in cell] + list(result))
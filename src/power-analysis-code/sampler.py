@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class IndexedPopulation:
+    """
+    Random access to a population written by
+    Simulation.write_simulation(..., index=True), without loading or
+    scanning the CSV. Outcomes are memory-mapped, and the CSV row of any
+    attempt is found from its combination's byte offset.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.offsets = np.load(filepath + ".offsets.npy")
+        self.permitted = np.load(filepath + ".permitted.npy", mmap_mode='r')
+        self.cells, self.observations = self.permitted.shape
+        self.row_bytes = np.diff(self.offsets) // self.observations
+
+
+    def sample_rows(self, size, rng):
+        """
+        Row numbers (within each combination) of a stratified sample of
+        size attempts per combination, drawn without replacement
+        """
+        return np.stack([rng.choice(self.observations, size, replace=False)
+                         for cell in range(self.cells)])
+
+
+    def stratified(self, size, rng):
+        """
+        Outcomes of a stratified sample of size attempts per combination,
+        as a (combinations, size) array, like stratified(simulation,
+        c("persona", "election", "party", "ad_type"), size=size) in R
+        """
+        rows = self.sample_rows(size, rng)
+        return self.permitted[np.arange(self.cells)[:, np.newaxis], rows]
+
+
+    def read_rows(self, cell, rows):
+        """The CSV text of the given rows of one combination (numbered from 0)"""
+        lines = []
+        with open(self.filepath, 'rb') as csvfile:
+            for row in rows:
+                csvfile.seek(self.offsets[cell] + row * self.row_bytes[cell])
+                lines.append(csvfile.read(self.row_bytes[cell]).decode())
+        return lines
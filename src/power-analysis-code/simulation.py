@@ -0,0 +1,315 @@
+import csv
+import gzip
+import io
+import time
+import numpy as np
+from parallel import imap_shards, map_shards
+
+
+class Characteristic:
+
+
+    def __init__(self, name, permitrate):
+        self.name = name
+        self.permitrate = permitrate
+
+
+    def __str__(self):
+        return self.name
+
+
+class Persona:
+
+
+    def __init__(self, country, election, party, ad_type):
+        self.country = country
+        self.election = election
+        self.party = party
+        self.ad_type = ad_type
+
+    def get_permitrate(self):
+        return self.country.permitrate * self.election.permitrate * \
+            self.party.permitrate * self.ad_type.permitrate
+
+
+class Design:
+    """
+    Named groups of Characteristics, crossed into combinations. The permit
+    rate of every combination is the product of its characteristics'
+    rates, computed once for the whole layout.
+
+    factors is a list of (name, characteristics) pairs, outermost first.
+    With fraction=1 every combination is included (full factorial).
+    With fraction=k only combinations whose level indices sum to a
+    multiple of k are included, the regular 1/k fraction that is
+    balanced when every factor's number of levels is a multiple of k.
+    """
+
+    def __init__(self, factors, fraction=1):
+        self.names = [name for name, characteristics in factors]
+        self.levels = [list(characteristics) for name, characteristics in factors]
+        self.fraction = fraction
+
+        # Outer product of every factor's permit rates
+        self.rate_grid = np.ones(())
+        for characteristics in self.levels:
+            self.rate_grid = np.multiply.outer(self.rate_grid,
+                                               [c.permitrate for c in characteristics])
+
+        # Level indices of each included combination, in output order
+        codes = np.indices(self.rate_grid.shape).reshape(len(self.levels), -1).T
+        if fraction > 1:
+            codes = codes[codes.sum(axis=1) % fraction == 0]
+        self.codes = codes.astype(np.uint16)
+        self.rates = self.rate_grid[tuple(self.codes.T)]
+
+
+    def get_cells(self):
+        """The Characteristics of every included combination, in output order"""
+        return [tuple(levels[code] for levels, code in zip(self.levels, row))
+                for row in self.codes.tolist()]
+
+
+class Simulation:
+
+
+    HEADER = ["persona.id", "persona", "election", "party", "ad_type",
+              "permitted", "total.observations", "groundtruth", "title"]
+
+    def __init__(self, observations, countries, elections, parties, ad_types, title,
+                 seed=None, shard_size=1000000):
+        self.countries = countries
+        self.elections = elections
+        self.parties = parties
+        self.ad_types = ad_types
+        design = Design([("persona", countries), ("election", elections),
+                         ("party", parties), ("ad_type", ad_types)])
+        ground_truth = [("Country", countries), ("Party", parties),
+                        ("Election", elections), ("Ad Type", ad_types)]
+        self.setup(observations, design, ground_truth, title, seed, shard_size)
+
+
+    @classmethod
+    def from_design(cls, observations, design, title, seed=None, shard_size=1000000):
+        """A Simulation over any number of named factors"""
+        simulation = cls.__new__(cls)
+        ground_truth = list(zip(design.names, design.levels))
+        simulation.setup(observations, design, ground_truth, title, seed, shard_size)
+        return simulation
+
+
+    def setup(self, observations, design, ground_truth, title, seed, shard_size):
+        self.observations = observations
+        self.design = design
+        self.ground_truth = ground_truth
+        self.title = title
+        self.header = self.HEADER[:1] + design.names + self.HEADER[5:]
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.shard_size = shard_size
+        self.rng = np.random.default_rng(self.seed_sequence)
+
+
+    def get_rng(self, *key):
+        """
+        An independent random stream for the given key. The same seed and
+        key always give the same stream, whichever process asks for it.
+        """
+        return np.random.default_rng(np.random.SeedSequence(self.seed_sequence.entropy,
+                                                            spawn_key=key))
+
+
+    def get_permitted(self, persona):
+        return self.rng.binomial(1,persona.get_permitrate(), size=self.observations)
+
+
+    def get_factors(self):
+        """Characteristic lists in the order they are nested in the output"""
+        return self.design.levels
+
+
+    def get_cells(self):
+        """Every combination of characteristics, in output order"""
+        return self.design.get_cells()
+
+
+    def get_rates(self):
+        """Permit rate of every combination, in output order"""
+        return self.design.rates
+
+
+    def get_shards(self):
+        """
+        Split the attempts of every combination, in output order, into
+        (start, stop) ranges of at most shard_size attempts
+        """
+        total = len(self.get_rates()) * self.observations
+        return [(start, min(start + self.shard_size, total))
+                for start in range(0, total, self.shard_size)]
+
+
+    def simulate_shard(self, shard):
+        """Draw one range of attempts in a single call, from its own stream"""
+        start, stop = shard
+        rates = self.get_rates()[np.arange(start, stop) // self.observations]
+        return self.get_rng(0, start // self.shard_size).binomial(1, rates)
+
+
+    def simulate_grid(self, workers=1):
+        """
+        Draw every attempt for every combination, one batched call per
+        shard, spread over workers processes. Returns (rates, permitted),
+        with one rate per combination and permitted of shape
+        (combinations, observations).
+        """
+        rates = self.get_rates()
+        permitted = np.concatenate(map_shards(self.simulate_shard, self.get_shards(), workers))
+        return rates, permitted.reshape(len(rates), self.observations)
+
+
+    def simulate_counts(self):
+        """
+        Draw the number of permitted attempts for every combination as
+        Binomial(observations, rate). Returns (rates, counts), one per
+        combination.
+        """
+        rates = self.get_rates()
+        counts = self.get_rng(1).binomial(self.observations, rates)
+        return rates, counts
+
+
+    def write_simulation(self, filepath, workers=1, compression=None, index=False):
+        """
+        Write one row per attempt, one shard at a time, so memory stays
+        flat whatever the number of rows. compression may be None, 'gzip'
+        or 'zstd' (which needs the zstandard package).
+
+        With index=True, also write filepath.offsets.npy, the byte offset
+        of every combination's first row (plus the end of the file), and
+        filepath.permitted.npy, every attempt's outcome as a
+        (combinations, observations) array that can be memory-mapped.
+        See sampler.IndexedPopulation.
+        """
+        if index and compression is not None:
+            raise ValueError("Byte offsets can only be indexed for uncompressed output")
+
+        # A combination only ever produces two distinct rows, so render
+        # both once and pick between them per attempt
+        lines = np.array([[self.format_row(i + 1, cell, result, rate) for result in (0, 1)]
+                          for i, (cell, rate) in enumerate(zip(self.get_cells(),
+                                                               self.get_rates()))],
+                         dtype=object)
+        if index:
+            # Both rows of a combination have the same length, so every
+            # combination's rows start at a fixed, computable offset
+            header = io.StringIO()
+            csv.writer(header, delimiter=',').writerow(self.header)
+            row_bytes = np.array([len(line.encode()) for line in lines[:, 0]])
+            offsets = np.concatenate([[0], np.cumsum(row_bytes * self.observations)])
+            np.save(filepath + ".offsets.npy", offsets + len(header.getvalue().encode()))
+            outcomes = np.lib.format.open_memmap(filepath + ".permitted.npy", mode='w+',
+                                                 dtype=np.uint8,
+                                                 shape=(len(lines), self.observations))
+
+        shards = self.get_shards()
+        rows = 0
+        started = time.perf_counter()
+        with open_output(filepath, compression) as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(self.header)
+            for (start, stop), permitted in zip(shards, imap_shards(self.simulate_shard,
+                                                                    shards, workers)):
+                cells = np.arange(start, stop) // self.observations
+                csvfile.write("".join(lines[cells, permitted]))
+                if index:
+                    outcomes.reshape(-1)[start:stop] = permitted
+                rows += stop - start
+                elapsed = time.perf_counter() - started
+                print("Wrote {} rows ({:.0f} rows/sec)".format(rows, rows / elapsed))
+        if index:
+            outcomes.flush()
+
+
+    def format_row(self, id, cell, attempt_result, groundtruth):
+        """Render one simulation row exactly as csv.writer would"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=',')
+        writer.writerow([id] + [c.name for c in cell] +
+                        [attempt_result, self.observations, groundtruth, self.title])
+        return buffer.getvalue()
+
+
+    def write_counts(self, filepath):
+        """
+        Write one row per combination, with the number of permitted
+        attempts out of total.observations in the permitted column
+        """
+        rates, counts = self.simulate_counts()
+        with open(filepath, 'w') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(self.header)
+            for i, (cell, rate, count) in enumerate(zip(self.get_cells(), rates, counts)):
+                writer.writerow([i + 1] + [c.name for c in cell] +
+                                [count, self.observations, rate, self.title])
+
+
+    def write_columnar(self, filepath, workers=1):
+        """
+        Write every attempt to a compressed .npz file. Characteristic names
+        are stored once per factor and referenced by integer codes, the
+        ground truth once per combination, and attempts as packed bits.
+        """
+        rates, permitted = self.simulate_grid(workers)
+        columns = {}
+        for column, factor, codes in zip(self.design.names, self.get_factors(),
+                                         self.design.codes.T):
+            columns[column + ".levels"] = np.array([c.name for c in factor])
+            columns[column] = codes
+        np.savez_compressed(filepath, permitted=np.packbits(permitted.astype(bool), axis=-1),
+                            groundtruth=rates, observations=self.observations,
+                            title=self.title, factors=np.array(self.design.names), **columns)
+
+
+    def write_ground_truth(self, filepath, rate_label="Blockrate"):
+        with open(filepath, 'w') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(["Label","Characteristic", rate_label])
+            for label, characteristics in self.ground_truth:
+                for characteristic in characteristics:
+                    writer.writerow([label, characteristic.name, characteristic.permitrate])
+
+
+def open_output(filepath, compression=None):
+    """
+    Open a text file for writing, optionally gzip or zstd compressed. Rows
+    are written as UTF-8 with csv's own line endings, whatever the
+    platform, so the byte offsets in write_simulation's index hold.
+    """
+    if compression is None:
+        return open(filepath, 'w', newline='', encoding='utf-8')
+    elif compression == 'gzip':
+        return gzip.open(filepath, 'wt', newline='', encoding='utf-8')
+    elif compression == 'zstd':
+        import zstandard
+        return zstandard.open(filepath, 'wt', newline='', encoding='utf-8')
+    else:
+        raise ValueError("Unknown compression: {}".format(compression))
+
+
+def read_columnar(filepath):
+    """
+    Load a file written by Simulation.write_columnar back into one array
+    per column of the CSV format, with one entry per attempt
+    """
+    with np.load(filepath) as data:
+        observations = int(data["observations"])
+        cells = len(data["groundtruth"])
+        permitted = np.unpackbits(data["permitted"], axis=-1, count=observations)
+        columns = {"persona.id": np.repeat(np.arange(1, cells + 1), observations)}
+        for column in data["factors"].tolist():
+            codes = np.repeat(data[column], observations)
+            columns[column] = data[column + ".levels"][codes]
+        columns["permitted"] = permitted.ravel()
+        columns["total.observations"] = np.full(cells * observations, observations)
+        columns["groundtruth"] = np.repeat(data["groundtruth"], observations)
+        columns["title"] = np.full(cells * observations, str(data["title"]))
+    return columns